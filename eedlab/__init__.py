@@ -1,4 +1,34 @@
-from .dg1022 import DG1022
-from .dm3058e import DM3058E
-from .dp832 import DP832
-from .ds1054 import DS1054
+import sys
+from importlib import import_module
+
+# drivers are imported on first use so scripts only pay for the ones they use
+_DRIVERS = {
+    'DG1022': '.dg1022',
+    'DM3058E': '.dm3058e',
+    'DP832': '.dp832',
+    'DS1054': '.ds1054',
+}
+
+__all__ = sorted(_DRIVERS)
+
+
+def __getattr__(name):
+    try:
+        module = _DRIVERS[name]
+    except KeyError:
+        raise AttributeError('module {} has no attribute {}'.format(__name__, name))
+    driver = getattr(import_module(module, __name__), name)
+    globals()[name] = driver
+    return driver
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
+if sys.version_info < (3, 7):
+    # no module __getattr__ (PEP 562) so import them all up front
+    from .dg1022 import DG1022
+    from .dm3058e import DM3058E
+    from .dp832 import DP832
+    from .ds1054 import DS1054
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Frequency response sweeps with a DG1022 channel driving the DUT and a
+DS1054 measuring its input and output
+"""
+import threading
+from time import sleep
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from .scpi import ask_many
+
+
+RESULT_DTYPE = np.dtype([
+    ('frequency', 'f8'), ('vin', 'f8'), ('vout', 'f8'), ('gain_db', 'f8'), ('phase', 'f8'),
+])
+
+
+def _float(res):
+    try:
+        return float(res)
+    except ValueError:
+        return np.nan  # the scope answers **** when it can't measure
+
+
+def _set_frequency(gen, f, errors):
+    """ set gen to f on a helper thread, keeping any exception in errors """
+    try:
+        gen.frequency = f
+    except Exception as e:
+        errors.append(e)
+
+
+def bode_sweep(gen, scope, freqs, in_chan=1, out_chan=2, cycles=4, settle=0.05, path=None):
+    """
+    Step gen (a DG1022Channel) through freqs and measure the gain and phase
+    from scope channel in_chan to out_chan at each
+
+    The timebase is set to show cycles periods of each frequency, and after
+    settle seconds plus two screens of acquisition the scope is stopped. The
+    generator is then moved to the next frequency on another thread while
+    the VPP and phase measurements are read in one transaction. Results are
+    written row by row to a RESULT_DTYPE array, or to an .npy file at path
+    so a partial sweep survives, which is returned.
+    """
+    freqs = np.asarray(freqs, dtype=np.float64)
+    if path is None:
+        result = np.zeros(len(freqs), dtype=RESULT_DTYPE)
+    else:
+        result = open_memmap(path, mode='w+', dtype=RESULT_DTYPE, shape=(len(freqs),))
+    result[:] = tuple([np.nan] * len(RESULT_DTYPE))
+    src_in = 'CHAN{}'.format(in_chan)
+    src_out = 'CHAN{}'.format(out_chan)
+    queries = [
+        ':measure:item? VPP,{}'.format(src_in),
+        ':measure:item? VPP,{}'.format(src_out),
+        ':measure:item? RPHase,{},{}'.format(src_out, src_in),
+    ]
+
+    gen.frequency = freqs[0]
+    try:
+        for k, f in enumerate(freqs):
+            timebase = cycles / f / 12.0  # 12 horizontal divisions
+            scope.timebase = timebase
+            scope.run()
+            sleep(settle + 2 * 12 * timebase)
+            scope.stop()
+            setup = None
+            errors = []
+            if k + 1 < len(freqs):
+                setup = threading.Thread(target=_set_frequency, args=(gen, freqs[k + 1], errors))
+                setup.start()
+            vin, vout, phase = [_float(r) for r in ask_many(scope, queries, scope.INPUT_BUFFER)]
+            if setup is not None:
+                setup.join()
+            result[k] = (f, vin, vout, 20 * np.log10(vout / vin), phase)
+            if path is not None:
+                result.flush()
+            if errors:
+                raise errors[0]  # the next frequency was never set
+    finally:
+        scope.run()
+    return result
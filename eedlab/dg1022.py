@@ -1,48 +1,27 @@
 #!/usr/bin/env python
-from universal_usbtmc import import_backend, UsbtmcError
-from sys import platform
-try:
-    from types import StringTypes
-except ImportError:
-    StringTypes = (str,)
-from collections import Iterable
+from .scpi import connect, post, resolve_backends, wait_opc, LazyModule, PROBE_TIMEOUT
 
 from time import sleep
+import hashlib
+
+# numpy is only imported by load_arb
+np = LazyModule('numpy')
 
 
 class DG1022(object):
     """
     Control the Rigol DM3058E Digital Multimeter from python
     """
-    def __init__(self, dev, backends=None):
-        if backends is None:
-            backends = ['python_usbtmc']
-            if "linux" in platform:
-                # this is a way better api to use than python_usbtmc, but but it only works on linux
-                backends.insert(0, 'linux_kernel')
-        elif not isinstance(backends, Iterable) or isinstance(backends, StringTypes):
-            backends = [backends]
-        self.__backends__ = backends
-
-        for be_name in backends:
-            try:
-                be = import_backend(be_name)
-                instr = be.Instrument(dev)
-                idn = instr.query('*IDN?')
-                self.instr = instr
-                self.backend = be
-                self.backend_name = be_name
-                break
-            except Exception as e:
-                # I hate this generic error handling too, but the many backends
-                # can throw so many different exception types its just easier
-                # to try and if anything goes wrong then try the next backend
-                print('Exceptional {}'.format(e))
-                pass
-        else:
-            raise UsbtmcError('no matching backends in {} connected using {}'.format(','.join(backends), dev))
+    # largest message the generator will take in one write
+    INPUT_BUFFER = 256
+
+    def __init__(self, dev, backends=None, timeout=PROBE_TIMEOUT):
+        self.__backends__ = resolve_backends(backends, ['python_usbtmc'])
+        self.instr, self.backend, self.backend_name, _ = connect(dev, self.__backends__, timeout=timeout)
 
         self.channels = [DG1022Channel(ch + 1, self) for ch in range(2)]
+        # digest of the waveform last loaded into volatile memory
+        self.arb_digest = None
 
     def ask(self, *args, **kwargs):
         ret = self.instr.query(*args, **kwargs)
@@ -51,12 +30,31 @@ class DG1022(object):
     def write(self, *args, **kwargs):
         return self.instr.write(*args, **kwargs)
 
+    def write_raw(self, *args, **kwargs):
+        return self.instr.write_raw(*args, **kwargs)
+
+    def batch(self):
+        """ queue writes and asks until the block ends, see scpi.Session.batch """
+        return self.instr.batch(self.INPUT_BUFFER)
+
     def __repr__(self):
         return self.idn()
 
     def idn(self):
         return self.ask('*IDN?')
 
+    def wait(self, timeout=10.0, block=False, **kwargs):
+        """ wait for pending operations to complete, see scpi.wait_opc """
+        return wait_opc(self, timeout=timeout, block=block, **kwargs)
+
+    def snapshot_state(self):
+        """ read and cache the state of every channel, returns {ch: state} """
+        return dict((ch.ch, ch.snapshot_state()) for ch in self.channels)
+
+    def apply_state(self, state):
+        """ apply {ch: state} with DG1022Channel.apply_state, returns the number of commands sent """
+        return sum(self.channels[ch - 1].apply_state(st) for ch, st in state.items())
+
     @property
     def unit(self):
         return self.ask('VOLTAGE:UNIT?')
@@ -99,7 +97,7 @@ class DG1022(object):
 
     @burst_period.setter
     def burst_period(self, period):
-        self.write('BURST:INTERNAL:PERIOD{}'.format(period))
+        self.write('BURST:INTERNAL:PERIOD {}'.format(period))
 
     @property
     def burst_phase(self):
@@ -107,7 +105,7 @@ class DG1022(object):
 
     @burst_phase.setter
     def burst_phase(self, phase):
-        self.write('BURST:PHASE{}'.format(phase))
+        self.write('BURST:PHASE {}'.format(phase))
 
     @property
     def burst(self):
@@ -121,11 +119,41 @@ class DG1022(object):
         self.write('BURST:STATE {}'.format(state))
 
 
+def _on_off(state):
+    if isinstance(state, str):
+        return state.upper() != 'OFF'
+    return bool(state)
+
+
 class DG1022Channel(object):
+    # SCPI header and value parser of each setting in a state snapshot, in
+    # the order they are applied
+    STATE = (
+        ('function', 'FUNCTION', lambda v: str(v).upper()),
+        ('frequency', 'FREQUENCY', float),
+        ('amplitude', 'VOLTAGE', float),
+        ('vdc', 'VOLTAGE:OFFSET', float),
+        ('duty', 'FUNCTION:SQUARE:DCYCLE', float),
+        ('sym', 'FUNCTION:RAMP:SYMM', float),
+        ('phase', 'PHASE', float),
+        ('load', 'OUTPUT:LOAD', lambda v: str(v).upper()),
+        ('output', 'OUTPUT', _on_off),
+    )
+    APPLY_STATE = ('function', 'frequency', 'amplitude', 'vdc')
 
     def __init__(self, ch, parent):
         self.ch = ch
         self.parent = parent
+        # build this channel's command strings once rather than on every call
+        suffix = '' if ch == 1 else ':CH{}'.format(ch)
+        headers = dict((key, header) for key, header, _ in self.STATE)
+        headers.update(vhigh='VOLTAGE:HIGH', vlow='VOLTAGE:LOW')
+        self._queries = dict((key, '{}{}?'.format(h, suffix)) for key, h in headers.items())
+        self._writes = dict((key, '{}{} {{}}'.format(h, suffix)) for key, h in headers.items())
+        self._apply = 'APPLY:{{}}{} {{}},{{}},{{}}'.format(suffix)
+        self._reply_prefix = 'CH{}:'.format(ch)
+        self._parse = dict((key, parse) for key, _, parse in self.STATE)
+        self._state = None
 
     def ask(self, message, num=-1, encoding='utf-8'):
         """ pass though for ch1, else append CH otherwise """
@@ -135,7 +163,7 @@ class DG1022Channel(object):
             message = ''.join(msg)
         res = self.parent.ask(message, num=num, encoding=encoding)
         if self.ch != 1:
-            res = res.replace('CH{}:'.format(self.ch), '')
+            res = post(res, lambda res: res.replace('CH{}:'.format(self.ch), ''))
         return res
 
     def write(self, message, encoding='utf-8'):
@@ -149,88 +177,164 @@ class DG1022Channel(object):
     def __repr__(self):
         return '{} CHANNEL {}'.format(self.parent, self.ch)
 
+    def _get(self, key):
+        res = self.parent.ask(self._queries[key])
+        if self.ch != 1:
+            res = post(res, lambda res: res.replace(self._reply_prefix, ''))
+        return res
+
+    def _set(self, key, value):
+        self.parent.write(self._writes[key].format(value))
+        if self._state is not None and key in self._state:
+            self._state[key] = self._parse[key](value)
+
     def apply(self, function=None, frequency=None, amplitude=None, offset=None):
-        return self.write('APPLY:{} {},{},{}'.format(function or '', frequency or '', amplitude or '', offset or ''))
+        self._state = None
+        return self.parent.write(self._apply.format(function or '', frequency or '', amplitude or '', offset or ''))
+
+    def snapshot_state(self):
+        """ read every STATE setting of this channel and cache it for apply_state """
+        self._state = dict((key, parse(self._get(key))) for key, _, parse in self.STATE)
+        return dict(self._state)
+
+    def apply_state(self, state):
+        """
+        Set this channel to state ({setting: value}, see STATE), only sending
+        the settings that differ from the cached snapshot
+
+        When more than one of APPLY_STATE changes they are all sent in one
+        APPLY command. Returns the number of commands sent.
+        """
+        if self._state is None:
+            self.snapshot_state()
+        want = dict(self._state)
+        want.update((key, self._parse[key](value)) for key, value in state.items())
+        changed = [key for key, _, _ in self.STATE if want[key] != self._state[key]]
+        sent = 0
+        if sum(key in changed for key in self.APPLY_STATE) > 1:
+            self.parent.write(self._apply.format(*[want[key] for key in self.APPLY_STATE]))
+            changed = [key for key in changed if key not in self.APPLY_STATE]
+            sent += 1
+        for key in changed:
+            value = want[key]
+            if key == 'output':
+                value = 'ON' if value else 'OFF'
+            self.parent.write(self._writes[key].format(value))
+            sent += 1
+        self._state = want
+        return sent
+
+    ARB_POINTS = 4096
+    DAC_MAX = 16383
+
+    def load_arb(self, samples, normalise=False, force=False, timeout=10.0):
+        """
+        Load samples (-1 to 1, or any range with normalise) into volatile
+        memory as one binary DATA:DAC block and select it as this channel's
+        function
+
+        The 14 bit DAC codes are hashed and the upload skipped when they
+        match what is already in volatile memory, unless force.
+        """
+        samples = np.asarray(samples, dtype=np.float64)
+        if not 1 < len(samples) <= self.ARB_POINTS:
+            raise ValueError('arb waveforms are 2 to {} points'.format(self.ARB_POINTS))
+        if normalise:
+            samples = samples - samples.min()
+            samples = samples / (samples.max() or 1.0) * 2 - 1
+        dac = np.rint((np.clip(samples, -1, 1) + 1) * (self.DAC_MAX / 2.0)).astype('<u2')
+        data = dac.tobytes()
+        digest = hashlib.sha1(data).hexdigest()
+        if force or digest != self.parent.arb_digest:
+            self.parent.arb_digest = None
+            header = '#{}{}'.format(len(str(len(data))), len(data)).encode()
+            self.parent.write_raw(b'DATA:DAC VOLATILE,' + header + data + b'\n')
+            self.parent.wait(timeout)
+            self.parent.arb_digest = digest
+        self.write('FUNCTION:USER VOLATILE')
+        self.function = 'USER'
 
     @property
     def phase(self):
-        return float(self.ask('PHASE?'))
+        return float(self._get('phase'))
 
     @phase.setter
     def phase(self, phs):
-        self.write('PHASE {}'.format(phs))
+        self._set('phase', phs)
 
     @property
     def function(self):
-        return self.ask('FUNCTION?')
+        return self._get('function')
 
     @function.setter
     def function(self, function):
-        return self.write('FUNCTION {}'.format(function))
+        return self._set('function', function)
 
     @property
     def duty(self):
         """ return the duty cycle of the square wave function """
-        return float(self.ask('FUNCTION:SQUARE:DCYCLE?'))
+        return float(self._get('duty'))
 
     @duty.setter
     def duty(self, percent):
         """ set the duty cycle of the square wave function """
-        self.write('FUNCTION:SQUARE:DCYCLE {}'.format(percent))
+        self._set('duty', percent)
 
     @property
     def sym(self):
         """ return the symmetry of the ramp function """
-        return float(self.ask('FUNCTION:RAMP:SYMM?'))
+        return float(self._get('sym'))
 
     @sym.setter
     def sym(self, percent):
         """ set the symmetry of the ramp function """
-        self.write('FUNCTION:RAMP:SYMM {}'.format(percent))
+        self._set('sym', percent)
 
     @property
     def frequency(self):
-        return float(self.ask('FREQUENCY?'))
+        return float(self._get('frequency'))
 
     @frequency.setter
     def frequency(self, freq):
-        self.write('FREQUENCY {}'.format(freq))
+        self._set('frequency', freq)
 
     @property
     def amplitude(self):
-        return float(self.ask('VOLTAGE?'))
+        return float(self._get('amplitude'))
 
     @amplitude.setter
     def amplitude(self, amp):
-        self.write('VOLTAGE {}'.format(amp))
+        self._set('amplitude', amp)
 
     @property
     def vdc(self):
-        return self.ask('VOLTAGE:OFFSET?')
+        return self._get('vdc')
 
     @vdc.setter
     def vdc(self, vdc):
-        self.write('VOLTAGE:OFFSET {}'.format(vdc))
+        self._set('vdc', vdc)
 
     @property
     def vhigh(self):
-        return self.ask('VOLTAGE:HIGH?')
+        return self._get('vhigh')
 
     @vhigh.setter
     def vhigh(self, vhigh):
-        self.write('VOLTAGE:HIGH {}'.format(vhigh))
+        self._set('vhigh', vhigh)
+        self._state = None  # changes amplitude and offset
 
     @property
     def vlow(self):
-        return self.ask('VOLTAGE:LOW?')
+        return self._get('vlow')
 
     @vlow.setter
     def vlow(self, vlow):
-        self.write('VOLTAGE:LOW {}'.format(vlow))
+        self._set('vlow', vlow)
+        self._state = None  # changes amplitude and offset
 
     @property
     def output(self):
-        state = self.ask('OUTPUT?')
+        state = self._get('output')
         if state.lower() == 'off':
             return False
         else:
@@ -240,7 +344,7 @@ class DG1022Channel(object):
     def output(self, state):
         if type(state) != str:
             state = 'ON' if state else 'OFF'
-        self.write('OUTPUT {}'.format(state))
+        self._set('output', state)
 
     def on(self):
         self.output = True
@@ -250,11 +354,11 @@ class DG1022Channel(object):
 
     @property
     def load(self):
-        return self.ask('OUTPUT:LOAD?')
+        return self._get('load')
 
     @load.setter
     def load(self, load):
-        return self.write('OUTPUT:LOAD {}'.format(load))
+        return self._set('load', load)
 
 
 class DG1022Channel2(object):
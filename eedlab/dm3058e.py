@@ -1,45 +1,24 @@
 #!/usr/bin/env python
-from universal_usbtmc import import_backend, UsbtmcError
-from sys import platform
-try:
-    from types import StringTypes
-except ImportError:
-    StringTypes = (str,)
-from collections import Iterable
+from .scpi import connect, post, resolve_backends, wait_opc, LazyModule, PROBE_TIMEOUT
+from time import time
+import threading
+
+# numpy and the ringbuffer are only imported once sample or stream is used
+np = LazyModule('numpy')
 
 
 class DM3058E(object):
     """
     Control the Rigol DM3058E Digital Multimeter from python
     """
-    def __init__(self, dev, backends=None):
+    def __init__(self, dev, backends=None, timeout=PROBE_TIMEOUT):
         self.dev = dev
-        if backends is None:
-            backends = ['python_usbtmc']
-            if "linux" in platform:
-                # this is a way better api to use than python_usbtmc, but but it only works on linux
-                backends.insert(0, 'linux_kernel')
-        elif not isinstance(backends, Iterable) or isinstance(backends, StringTypes):
-            backends = [backends]
-        self.__backends__ = backends
-
-        for be_name in backends:
-            try:
-                be = import_backend(be_name)
-                instr = be.Instrument(dev)
-                idn = instr.query('*IDN?')
-                self.instr = instr
-                self.backend = be
-                self.backend_name = be_name
-                break
-            except Exception:
-                # I hate this generic error handling too, but the many backends
-                # can throw so many different exception types its just easier
-                # to try and if anything goes wrong then try the next backend
-                pass
-        else:
-            raise UsbtmcError('no matching backends in {} connected using {}'.format(','.join(backends), dev))
+        self.__backends__ = resolve_backends(backends, ['python_usbtmc'])
+        self.instr, self.backend, self.backend_name, _ = connect(dev, self.__backends__, timeout=timeout)
         self.write(':measure AUTO')
+        # function, and rate per function, last selected through this driver
+        self._function = None
+        self._rate = {}
 
 
     FUNC_LUT = {
@@ -56,8 +35,31 @@ class DM3058E(object):
         'CAPACITANCE': 'function:capacitance',
     }
 
+    RATE_LUT = {
+        'VDC': ':rate:voltage:DC',
+        'VAC': ':rate:voltage:AC',
+        'IDC': ':rate:current:DC',
+        'IAC': ':rate:current:AC',
+        'RESISTANCE': ':rate:resistance',
+        'FRESISTANCE': ':rate:fresistance',
+    }
+
+    # approximate readings per second of each rate, used to size timeouts
+    READING_RATES = {
+        'SLOW': 2.5,
+        'MEDIUM': 20.0,
+        'FAST': 123.0,
+    }
+
+    # largest message the meter will take in one write
+    INPUT_BUFFER = 256
+
     def ask(self, *args, **kwargs):
-        res = self.instr.query(*args, **kwargs).split()
+        return post(self.instr.query(*args, **kwargs), self._strip_block)
+
+    @staticmethod
+    def _strip_block(res):
+        res = res.split()
         if res[0][0] == '#':
             return ' '.join(res[1::])
         return ' '.join(res)
@@ -65,12 +67,20 @@ class DM3058E(object):
     def write(self, *args, **kwargs):
         return self.instr.write(*args, **kwargs)
 
+    def batch(self):
+        """ queue writes and asks until the block ends, see scpi.Session.batch """
+        return self.instr.batch(self.INPUT_BUFFER)
+
     def __repr__(self):
         return self.idn()
 
     def idn(self):
         return self.ask('*IDN?')
 
+    def wait(self, timeout=10.0, block=False, **kwargs):
+        """ wait for pending operations to complete, see scpi.wait_opc """
+        return wait_opc(self, timeout=timeout, block=block, **kwargs)
+
     @property
     def function(self):
         return {'set':self.ask(':function?'), 'options': self.FUNC_LUT.keys()}
@@ -81,11 +91,31 @@ class DM3058E(object):
             self.write(self.FUNC_LUT[func.upper()])
         except KeyError:
             raise KeyError('Unknown function type')
-        return self.ask(':function?')
+        self._function = func.upper()
+
+    def invalidate(self):
+        """ forget the tracked function and rate after configuring the meter directly """
+        self._function = None
+        self._rate.clear()
+
+    def measure(self, func):
+        """
+        Take a reading of func (see FUNC_LUT)
+
+        When func is already the active function a bare :read? is sent,
+        skipping the function and range reselection of :measure:<func>?.
+        """
+        func = func.upper()
+        with self.instr.lock:
+            if self._function == func:
+                return float(self.ask(':read?'))
+            res = float(self.ask(':measure:{}?'.format(self.FUNC_LUT[func].split(':', 1)[1])))
+            self._function = func
+        return res
 
     @property
     def vdc(self):
-        return float(self.ask(':measure:voltage:DC?'))
+        return self.measure('VDC')
 
     @vdc.setter
     def vdc(self, cmd):
@@ -115,45 +145,166 @@ class DM3058E(object):
             self.write(cmd_lut[cmd])
         except KeyError:
             raise KeyError('Unknown voltage command')
+        if cmd_lut[cmd].startswith(':rate'):
+            self._rate['VDC'] = cmd_lut[cmd].split()[-1].upper()
+        else:
+            self._function = 'VDC'
 
     @property
     def vac(self):
-        return float(self.ask(':measure:voltage:AC?'))
+        return self.measure('VAC')
 
     @property
     def idc(self):
-        return float(self.ask(':measure:current:DC?'))
+        return self.measure('IDC')
 
     @property
     def iac(self):
-        return float(self.ask(':measure:current:AC?'))
+        return self.measure('IAC')
 
     @property
     def resistance(self):
-        return float(self.ask(':measure:resistance?'))
+        return self.measure('RESISTANCE')
 
     @property
     def resistance4(self):
-        return float(self.ask(':measure:fresistance?'))
+        return self.measure('FRESISTANCE')
 
     @property
     def frequency(self):
-        return float(self.ask(':measure:frequency?'))
+        return self.measure('FREQUENCY')
 
     @property
     def period(self):
-        return float(self.ask(':measure:period?'))
+        return self.measure('PERIOD')
 
     @property
     def continuity(self):
-        return float(self.ask(':measure:continuity?'))
+        return self.measure('CONTINUITY')
 
     @property
     def diode(self):
-        return float(self.ask(':measure:diode?'))
+        return self.measure('DIODE')
 
     @property
     def capacitance(self):
-        return float(self.ask(':measure:capacitance?'))
+        return self.measure('CAPACITANCE')
 
+    def sample(self, function, n, rate='FAST', timeout=None):
+        """
+        Take n readings of function (see FUNC_LUT) into the meter's reading
+        memory at <rate> (SLOW|MEDIUM|FAST) and read them all back in one
+        response
+
+        Returns (t, readings) numpy arrays, t being the seconds since the
+        acquisition started spread evenly over the time it took. The meter
+        is held for the whole acquisition.
+        """
+        func = function.upper()
+        rate = rate.upper()
+        if timeout is None:
+            timeout = 10.0 + 2 * n / self.READING_RATES.get(rate, 1.0)
+        with self.instr.lock:
+            if self._function != func:
+                self.function = func
+            if func in self.RATE_LUT and self._rate.get(func) != rate:
+                self.write('{} {}'.format(self.RATE_LUT[func], rate))
+                self._rate[func] = rate
+            self.write(':trigger:source immediate')
+            self.write(':sample:count {}'.format(int(n)))
+            try:
+                t0 = time()
+                self.write(':initiate')
+                self.wait(timeout)
+                elapsed = time() - t0
+                readings = np.array(self.ask(':fetch?').split(','), dtype=float)
+            finally:
+                self.write(':sample:count 1')
+                self.write(':measure AUTO')
+        t = np.arange(len(readings)) * (elapsed / max(len(readings), 1))
+        return t, readings
 
+    def stream(self, function='VDC', size=100000, block=1, rate='FAST'):
+        """ start and return a DM3058EStream logging function in the background """
+        return DM3058EStream(self, function, size, block, rate).start()
+
+
+class DM3058EStream(object):
+    """
+    Log a DM3058E on a background thread into a RingBuffer of (t, reading)
+    rows while keeping RunningStats of every reading
+
+    With block=1 each reading is a DM3058E.measure round trip, otherwise
+    blocks of readings are taken with DM3058E.sample at rate. Both hold the
+    meter's Session for their whole exchange, so other threads can keep
+    using the meter, between blocks, while it streams.
+    """
+    def __init__(self, dmm, function='VDC', size=100000, block=1, rate='FAST'):
+        from .ringbuffer import RingBuffer, RunningStats
+        self.dmm = dmm
+        self.function = function.upper()
+        self.block = block
+        self.rate = rate
+        self.ring = RingBuffer(size, 2)
+        self.stats = RunningStats()
+        self.error = None
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def subscribe(self, callback):
+        """ call callback(t, readings) from the logging thread with every new block """
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self._subscribers.remove(callback)
+
+    def snapshot(self, n=None):
+        """ return a copy of the latest n (t, reading) rows and the running stats """
+        with self._lock:
+            return self.ring.latest(n).copy(), self.stats.as_dict()
+
+    def _read_block(self):
+        if self.block == 1:
+            t = time()
+            return np.array([t]), np.array([self.dmm.measure(self.function)])
+        t0 = time()
+        t, readings = self.dmm.sample(self.function, self.block, self.rate)
+        return t0 + t, readings
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                t, readings = self._read_block()
+            except Exception as e:
+                self.error = e
+                break
+            with self._lock:
+                self.ring.extend(np.column_stack((t, readings)))
+                self.stats.update(readings)
+            for callback in list(self._subscribers):
+                callback(t, readings)
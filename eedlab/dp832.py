@@ -1,45 +1,41 @@
 #!/usr/bin/env python
-from universal_usbtmc import import_backend, UsbtmcError
-from sys import platform
+from .scpi import ask_many, connect, join_messages, resolve_backends, wait_opc, drain_errors, LazyModule, ScpiError, PROBE_TIMEOUT
+from contextlib import contextmanager
+import threading
+from time import sleep
 try:
-    from types import StringTypes
+    from time import monotonic
 except ImportError:
-    StringTypes = (str,)
-from collections import Iterable
+    from time import time as monotonic
+
+# numpy costs more than the rest of the driver to import, so it is only
+# imported by the features that use it (as is the ringbuffer built on it)
+np = LazyModule('numpy')
+
+
+# fields of each row, one per channel, of DP832.snapshot
+SNAPSHOT_FIELDS = [
+    ('voltage', 'f8'), ('current', 'f8'), ('power', 'f8'),
+    ('vset', 'f8'), ('iset', 'f8'), ('state', '?'),
+    ('vmin', 'f8'), ('vmax', 'f8'), ('imin', 'f8'), ('imax', 'f8'),
+]
 
 
 class DP832(object):
     """
     Control the Rigol DP832 Power Supply Unit from python
     """
-    def __init__(self, dev, backends=None):
-        if backends is None:
-            backends = ['python_usbtmc', 'python_vxi11']
-            if "linux" in platform:
-                # this is a way better api to use than python_usbtmc, but but it only works on linux
-                backends.insert(0, 'linux_kernel')
-        elif not isinstance(backends, Iterable) or isinstance(backends, StringTypes):
-            backends = [backends]
-        self.__backends__ = backends
-
-        for be_name in backends:
-            try:
-                be = import_backend(be_name)
-                instr = be.Instrument(dev)
-                idn = instr.query('*IDN?')
-                self.instr = instr
-                self.backend = be
-                self.backend_name = be_name
-                break
-            except Exception:
-                # I hate this generic error handling too, but the many backends
-                # can throw so many different exception types its just easier
-                # to try and if anything goes wrong then try the next backend
-                pass
-        else:
-            raise UsbtmcError('no matching backends in {} connected using {}'.format(','.join(backends), dev))
+    # largest message the supply will take in one write
+    INPUT_BUFFER = 256
+
+    def __init__(self, dev, backends=None, timeout=PROBE_TIMEOUT):
+        self.__backends__ = resolve_backends(backends, ['python_usbtmc', 'raw_socket', 'python_vxi11'])
+        self.instr, self.backend, self.backend_name, _ = connect(dev, self.__backends__, timeout=timeout)
         self.write(':measure AUTO')
         self.channels = [Channel(self, ch) for ch in range(3)]
+        self._limits = None
+        # read back after each setter, see deferred()
+        self.readback = True
 
     def ask(self, *args, **kwargs):
         return self.instr.query(*args, **kwargs)
@@ -47,12 +43,294 @@ class DP832(object):
     def write(self, *args, **kwargs):
         return self.instr.write(*args, **kwargs)
 
+    def batch(self):
+        """ queue writes and asks until the block ends, see scpi.Session.batch """
+        return self.instr.batch(self.INPUT_BUFFER)
+
     def __repr__(self):
         return self.idn()
 
     def idn(self):
         return self.ask('*IDN?')
 
+    def ask_many(self, queries):
+        """ send queries joined with ';' in as few messages as fit INPUT_BUFFER, see scpi.ask_many """
+        return ask_many(self, queries, self.INPUT_BUFFER)
+
+    @property
+    def limits(self):
+        """ (vmin, vmax, imin, imax) of each channel, these never change so are only read once """
+        if self._limits is None:
+            queries = []
+            for ch in range(1, len(self.channels) + 1):
+                queries += [':source{}:voltage? min'.format(ch), ':source{}:voltage? max'.format(ch),
+                            ':source{}:current? min'.format(ch), ':source{}:current? max'.format(ch)]
+            res = [float(r) for r in self.ask_many(queries)]
+            self._limits = [tuple(res[i:i + 4]) for i in range(0, len(res), 4)]
+        return self._limits
+
+    def snapshot(self):
+        """
+        Read the measured and set voltage/current, power and output state of
+        every channel in one transaction
+
+        Returns a SNAPSHOT_FIELDS record array with a row per channel.
+        """
+        queries = []
+        for ch in self.channels:
+            name = Channel.CH_MAP[ch.ch]
+            queries += [':measure:all:DC? {}'.format(name), ':source{}:voltage?'.format(ch.ch + 1),
+                        ':source{}:current?'.format(ch.ch + 1), ':output:state? {}'.format(name)]
+        res = self.ask_many(queries)
+        snap = np.zeros(len(self.channels), dtype=SNAPSHOT_FIELDS)
+        for row, limits in enumerate(self.limits):
+            act, vset, iset, state = res[4 * row:4 * row + 4]
+            snap[row] = tuple(float(v) for v in act.split(',')) + (float(vset), float(iset), state.upper() == 'ON') + limits
+        return snap.view(np.recarray)
+
+    def sync(self):
+        """ drain the error queue, raising ScpiError if any command was rejected """
+        errors = drain_errors(self)
+        if errors:
+            raise ScpiError(errors)
+
+    @contextmanager
+    def deferred(self):
+        """
+        Within the block the channel setters only write, skipping their read
+        back, and the error queue is checked by sync() once on leaving it
+
+        Errors already queued are discarded on entry, call sync() first to
+        check them, and so are the block's own if it raises.
+        """
+        drain_errors(self)
+        readback = self.readback
+        self.readback = False
+        ok = False
+        try:
+            yield self
+            ok = True
+        finally:
+            self.readback = readback
+            if not ok:
+                drain_errors(self)
+        self.sync()
+
+    def profile(self, times, setpoints, hold=1.0, use_timer='auto'):
+        """ start and return a DP832Profile applying setpoints at times """
+        return DP832Profile(self, times, setpoints, hold, use_timer).start()
+
+    def telemetry(self, rate=10.0, size=100000):
+        """ start and return a DP832Telemetry polling every channel rate times a second """
+        return DP832Telemetry(self, rate, size).start()
+
+    def wait(self, timeout=10.0, block=False, **kwargs):
+        """ wait for pending operations to complete, see scpi.wait_opc """
+        return wait_opc(self, timeout=timeout, block=block, **kwargs)
+
+
+class DP832Telemetry(object):
+    """
+    Poll the voltage, current and power of every DP832 channel on a
+    background thread into a preallocated RingBuffer with a column per
+    value (see COLUMNS) and monotonic timestamps
+
+    Each poll is one :measure:all:DC? transaction for all channels, so the
+    supply can still be used from other threads while polling. Polls are
+    scheduled on a fixed grid, the lateness of each is kept as jitter
+    statistics and grid points missed because a poll overran are counted as
+    dropped.
+    """
+    COLUMNS = ('t', 'v1', 'i1', 'p1', 'v2', 'i2', 'p2', 'v3', 'i3', 'p3')
+
+    def __init__(self, psu, rate=10.0, size=100000):
+        from .ringbuffer import RingBuffer, RunningStats
+        self.psu = psu
+        self.period = 1.0 / rate
+        self.ring = RingBuffer(size, len(self.COLUMNS))
+        self.jitter = RunningStats()
+        self.dropped = 0
+        self.error = None
+        self._queries = [':measure:all:DC? {}'.format(Channel.CH_MAP[ch.ch]) for ch in psu.channels]
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def column(self, name, n=None):
+        """ view of the latest n samples of column name """
+        return self.latest(n)[:, self.COLUMNS.index(name)]
+
+    def latest(self, n=None):
+        """ view (no copy) of the latest n rows, valid until the ring wraps over them """
+        return self.ring.latest(n)
+
+    @property
+    def stats(self):
+        return {
+            'samples': self.ring.count,
+            'dropped': self.dropped,
+            'jitter_mean': float(self.jitter.mean[0]),
+            'jitter_std': float(self.jitter.std[0]),
+            'jitter_max': float(self.jitter.max[0]),
+        }
+
+    def _run(self):
+        row = np.empty(len(self.COLUMNS))
+        t_next = monotonic()
+        while not self._stop.is_set():
+            delay = t_next - monotonic()
+            if delay > 0:
+                sleep(delay)
+            t = monotonic()
+            try:
+                res = self.psu.ask_many(self._queries)
+            except Exception as e:
+                self.error = e
+                break
+            row[0] = t
+            row[1:] = [float(v) for r in res for v in r.split(',')]
+            self.ring.append(row)
+            self.jitter.update(t - t_next)
+            t_next += self.period
+            missed = int((monotonic() - t_next) // self.period)
+            if missed > 0:
+                self.dropped += missed
+                t_next += missed * self.period
+
+
+class DP832Profile(object):
+    """
+    Apply a vectorised setpoint profile to a DP832
+
+    setpoints maps (channel index, 'vdc'|'idc') to arrays of values to set
+    times[k] seconds after start. When the whole profile is one channel with
+    both vdc and idc, starts at times[0] == 0 and every step dwells at least
+    TIMER_MIN_DWELL the supply's timer is loaded with it once and runs it on
+    its own (the last step is held for hold seconds). Otherwise the
+    setpoints of each step are written in one message by a background thread that sleeps until just
+    before each step and spins the rest of the way. The achieved step times
+    are kept in achieved (not available in timer mode), see timing.
+    """
+    TIMER_MAX_GROUPS = 2048
+    TIMER_MIN_DWELL = 1.0
+    SPIN = 0.002
+
+    CMDS = {
+        'vdc': ':source{}:volt {{}}',
+        'idc': ':source{}:current {{}}',
+    }
+
+    def __init__(self, psu, times, setpoints, hold=1.0, use_timer='auto'):
+        self.psu = psu
+        self.times = np.asarray(times, dtype=np.float64)
+        self.setpoints = {key: np.asarray(v, dtype=np.float64) for key, v in setpoints.items()}
+        for key, v in self.setpoints.items():
+            if v.shape != self.times.shape:
+                raise ValueError('setpoints {} do not match times'.format(key))
+        self.hold = hold
+        if use_timer == 'auto':
+            use_timer = self._timer_ok()
+        elif use_timer and len(self.times) and self.times[0] != 0:
+            raise ValueError('the timer starts its first step at once, times[0] must be 0')
+        self.mode = 'timer' if use_timer else 'stream'
+        self.achieved = None if use_timer else np.full(len(self.times), np.nan)
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _timer_ok(self):
+        chans = set(ch for ch, _ in self.setpoints)
+        return (len(chans) == 1 and len(self.setpoints) == 2 and
+                0 < len(self.times) <= self.TIMER_MAX_GROUPS and self.times[0] == 0 and
+                self.hold >= self.TIMER_MIN_DWELL and
+                (len(self.times) < 2 or np.diff(self.times).min() >= self.TIMER_MIN_DWELL))
+
+    def start(self):
+        if self.mode == 'timer':
+            self._upload()
+        else:
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self.mode == 'timer':
+            ch, _ = next(iter(self.setpoints))
+            self.psu.write(':timer:state {},OFF'.format(Channel.CH_MAP[ch]))
+        else:
+            self._stop.set()
+            self.join()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def timing(self):
+        """ lateness of each applied step against times, None in timer mode where it isn't measured """
+        if self.achieved is None:
+            return None
+        late = self.achieved - self.times
+        late = late[~np.isnan(late)]
+        return {
+            'steps': len(late),
+            'late_mean': float(late.mean()) if len(late) else 0.0,
+            'late_max': float(late.max()) if len(late) else 0.0,
+        }
+
+    def _upload(self):
+        ch, _ = next(iter(self.setpoints))
+        name = Channel.CH_MAP[ch]
+        dwell = np.append(np.diff(self.times), self.hold)
+        cmds = [':timer:state {},OFF'.format(name), ':timer:groups {},{}'.format(name, len(dwell))]
+        cmds += [':timer:parameter {},{},{},{},{}'.format(name, k, v, i, d) for k, (v, i, d) in
+                 enumerate(zip(self.setpoints[ch, 'vdc'], self.setpoints[ch, 'idc'], dwell))]
+        cmds += [':timer:cycles {},N,1'.format(name), ':timer:endstate {},LAST'.format(name),
+                 ':timer:state {},ON'.format(name)]
+        for msg in join_messages(cmds, self.psu.INPUT_BUFFER):
+            self.psu.write(msg)
+
+    def _run(self):
+        keys = list(self.setpoints)
+        cmds = [self.CMDS[what].format(ch + 1) for ch, what in keys]
+        t0 = monotonic()
+        try:
+            for k, t in enumerate(self.times):
+                deadline = t0 + t
+                while True:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0 or self._stop.is_set():
+                        break
+                    if remaining > self.SPIN:
+                        sleep(remaining - self.SPIN)
+                if self._stop.is_set():
+                    break
+                for msg in join_messages([cmd.format(self.setpoints[key][k]) for cmd, key in zip(cmds, keys)],
+                                         self.psu.INPUT_BUFFER):
+                    self.psu.write(msg)
+                self.achieved[k] = monotonic() - t0
+        except Exception as e:
+            self.error = e
+
 
 class Channel(object):
     CH_MAP = {
@@ -92,27 +370,27 @@ class Channel(object):
     def vdc(self):
         vact = float(self.ask(':measure:voltage:DC? {}'.format(self.CH_MAP[self.ch])))
         vset = float(self.ask(':source{}:voltage?'.format(self.ch + 1)))
-        vmin = float(self.ask(':source{}:voltage? min'.format(self.ch + 1)))
-        vmax = float(self.ask(':source{}:voltage? max'.format(self.ch + 1)))
+        vmin, vmax = self.parent.limits[self.ch][:2]
         return { 'act': vact, 'set': vset, 'min': vmin, 'max': vmax}
 
     @vdc.setter
     def vdc(self, vset):
         self.write(':source{}:volt {}'.format(self.ch + 1, vset))
-        self.ask(':source{}:volt?'.format(self.ch + 1))  # this seems to change the value
+        if self.parent.readback:
+            self.ask(':source{}:volt?'.format(self.ch + 1))  # this seems to change the value
 
     @property
     def idc(self):
         iact = float(self.ask(':measure:current:DC? {}'.format(self.CH_MAP[self.ch])))
         iset = float(self.ask(':source{}:current?'.format(self.ch + 1)))
-        imin = float(self.ask(':source{}:current? min'.format(self.ch + 1)))
-        imax = float(self.ask(':source{}:current? max'.format(self.ch + 1)))
+        imin, imax = self.parent.limits[self.ch][2:]
         return { 'act': iact, 'set': iset, 'min': imin, 'max': imax}
 
     @idc.setter
     def idc(self, iset):
         self.write(':source{}:current {}'.format(self.ch + 1, iset))
-        self.ask(':source{}:current?'.format(self.ch + 1))    # this seems to change the value
+        if self.parent.readback:
+            self.ask(':source{}:current?'.format(self.ch + 1))    # this seems to change the value
 
     @property
     def state(self):
@@ -121,7 +399,8 @@ class Channel(object):
     @state.setter
     def state(self, state):
         self.write(':output:state {},{}'.format(self.CH_MAP[self.ch], state))
-        self.state  # this seems to turn it on/off ?
+        if self.parent.readback:
+            self.state  # this seems to turn it on/off ?
 
     def on(self):
         self.state = 'ON'
@@ -1,43 +1,117 @@
-from vxi11 import Instrument
-from universal_usbtmc import import_backend, UsbtmcError
-from sys import platform
+from .scpi import ask_many, connect, post, resolve_backends, wait_opc, PROBE_TIMEOUT
 try:
     from types import StringTypes
 except ImportError:
     StringTypes = (str,)
-from collections import Iterable
 import logging
+import json
+from collections import namedtuple
+import numpy as np
+import threading
+from time import sleep, time
+try:
+    from queue import Queue, Full
+except ImportError:
+    from Queue import Queue, Full
 
 
-class DS1054(Instrument):
+# numpy dtype of a single raw sample for each :WAV:FORMAT
+WAV_DTYPES = {
+    'BYTE': np.uint8,
+    'WORD': np.dtype('<u2'),
+}
 
-    def __init__(self, dev, backends=None):
-        if backends is None:
-            backends = ['python_vxi11', 'python_usbtmc']
-            if "linux" in platform:
-                # this is a way better api to use than python_usbtmc, but but it only works on linux
-                backends.insert(0, 'linux_kernel')
-        elif not isinstance(backends, Iterable) or isinstance(backends, StringTypes):
-            backends = [backends]
-        self.__backends__ = backends
 
-        for be_name in backends:
-            try:
-                be = import_backend(be_name)
-                instr = be.Instrument(dev)
-                idn = instr.query('*IDN?')
-                self.instr = instr
-                self.backend = be
-                self.backend_name = be_name
-                break
-            except Exception as e:
-                # I hate this generic error handling too, but the many backends
-                # can throw so many different exception types its just easier
-                # to try and if anything goes wrong then try the next backend
-                pass
-        else:
-            raise UsbtmcError('no matching backends in {} connected using {}'.format(','.join(backends), dev))
+def parse_block(data):
+    """ return the payload of an IEEE 488.2 definite length block (#NXXXX...) """
+    data = memoryview(data)
+    n = int(bytes(data[1:2]))
+    length = int(bytes(data[2:2 + n]))
+    return data[2 + n:2 + n + length]
+
+
+class Preamble(namedtuple('Preamble', ('format', 'type', 'points', 'count',
+                                       'x_increment', 'x_origin', 'x_reference',
+                                       'y_increment', 'y_origin', 'y_reference'))):
+    """ parsed :WAV:PREamble? response """
+    __slots__ = ()
+
+    @classmethod
+    def parse(cls, res):
+        fields = res.split(',')
+        return cls(*([int(f) for f in fields[:4]] + [float(f) for f in fields[4:]]))
+
 
+# scaling parameters saved alongside a raw DS1054.capture
+CAPTURE_PARAMS = ('x_origin', 'x_reference', 'x_increment', 'y_origin', 'y_reference', 'y_increment')
+
+
+class Capture(object):
+    """
+    Lazily scaled view of a raw trace saved by DS1054.capture, indexing
+    returns volts while raw holds the memory mapped samples
+    """
+    def __init__(self, raw, meta):
+        self.raw = raw
+        self.meta = meta
+        for k in CAPTURE_PARAMS:
+            setattr(self, k, meta[k])
+
+    def __len__(self):
+        return len(self.raw)
+
+    def __getitem__(self, idx):
+        return (self.raw[idx] - (self.y_origin + self.y_reference)) * self.y_increment
+
+    def __array__(self, dtype=None, copy=None):
+        # self[:] is always a new array, so there is nothing to copy
+        return np.asarray(self[:], dtype=dtype)
+
+    @property
+    def t(self):
+        """ time of each sample relative to the trigger """
+        return (np.arange(len(self.raw)) - self.x_reference) * self.x_increment + self.x_origin
+
+
+def load_capture(path, mode='r'):
+    """ open a raw trace saved by DS1054.capture as a Capture """
+    with open(path + '.json') as f:
+        meta = json.load(f)
+    raw = np.memmap(path, dtype=WAV_DTYPES[meta['fmt']], mode=mode, shape=(meta['points'],))
+    return Capture(raw, meta)
+
+
+def _float_or_str(res):
+    try:
+        return float(res)
+    except (ValueError, TypeError):
+        return res
+
+
+def _scale_traces(raw, pres, start, dtype):
+    """ scale the rows of raw to volts with their preambles, returns (traces, t) """
+    y_offset = np.array([[pre.y_origin + pre.y_reference] for pre in pres])
+    y_increment = np.array([[pre.y_increment] for pre in pres])
+    traces = np.subtract(raw, y_offset, dtype=dtype)
+    traces *= y_increment
+    pre = pres[0]
+    t = (np.arange(start - 1, start - 1 + raw.shape[1]) - pre.x_reference) * pre.x_increment + pre.x_origin
+    return traces, t
+
+
+class DS1054(object):
+    # largest message the scope will take in one write
+    INPUT_BUFFER = 256
+
+    def __init__(self, dev, backends=None, cache=False, timeout=PROBE_TIMEOUT):
+        self._dev_ = dev
+        self.__backends__ = resolve_backends(backends, ['raw_socket', 'python_vxi11', 'python_usbtmc'])
+        self.instr, self.backend, self.backend_name, _ = connect(dev, self.__backends__, timeout=timeout)
+
+        self._wav = {'SOURCE': None, 'MODE': None, 'FORMAT': None}
+        self._preamble = {}
+        # settings written or read through the properties, None when caching is off
+        self._settings = {} if cache else None
         self.channels = [DS1054Channel(ch + 1, self) for ch in range(4)]
 
     @property
@@ -45,7 +119,11 @@ class DS1054(Instrument):
         return self._dev_
 
     def ask(self, *args, **kwargs):
-        return self.instr.query(*args, **kwargs).replace('\n', '')
+        return post(self.instr.query(*args, **kwargs), lambda res: res.replace('\n', ''))
+
+    def batch(self):
+        """ queue writes and asks until the block ends, see scpi.Session.batch """
+        return self.instr.batch(self.INPUT_BUFFER)
 
     def ask_raw(self, *args, **kwargs):
         return self.instr.query_raw(*args, **kwargs)
@@ -53,9 +131,17 @@ class DS1054(Instrument):
     def write(self, *args, **kwargs):
         return self.instr.write(*args, **kwargs)
 
+    def ask_many(self, queries):
+        """ send queries joined with ';' in as few messages as fit INPUT_BUFFER, see scpi.ask_many """
+        return ask_many(self, queries, self.INPUT_BUFFER)
+
     def idn(self):
         return self.ask('*IDN?')
 
+    def wait(self, timeout=10.0, block=False, **kwargs):
+        """ wait for pending operations to complete, see scpi.wait_opc """
+        return wait_opc(self, timeout=timeout, block=block, **kwargs)
+
     def opc(self):
         return self.ask('*OPC?')
 
@@ -63,38 +149,71 @@ class DS1054(Instrument):
         return self.idn()
 
     def clear(self):
+        self.invalidate()
         self.write(':CLEAR')
 
     def run(self):
+        self.invalidate_preamble()
         self.write(':RUN')
 
     def stop(self):
+        # the MAX mode preamble covers the screen while running but the
+        # whole memory once stopped
+        self.invalidate_preamble()
         self.write(':STOP')
 
     def single(self):
+        self.invalidate_preamble()
+        self._forget('trigger_mode')  # :SINGLE switches the sweep to single
         self.write(':SINGLE')
 
     def force(self):
         self.write(':TFORCE')
 
+    def _cached(self, key, read):
+        """ return the cached setting key, calling read() to fill it on a miss """
+        if self._settings is None:
+            return read()
+        try:
+            return self._settings[key]
+        except KeyError:
+            val = self._settings[key] = read()
+            return val
+
+    def _remember(self, key, value):
+        if self._settings is not None:
+            self._settings[key] = value
+
+    def _forget(self, key):
+        if self._settings is not None:
+            self._settings.pop(key, None)
+
+    def invalidate(self):
+        """ drop all cached settings and preambles so they are read from the scope again """
+        if self._settings is not None:
+            self._settings.clear()
+        self.invalidate_preamble()
+
     @property
     def trigger_status(self):
         return self.ask('TRIGGER:STATUS?')
 
     @property
     def trigger_mode(self):
-        return self.ask('TRIGGER:SWEEP?')
+        return self._cached('trigger_mode', lambda: self.ask('TRIGGER:SWEEP?'))
 
     @trigger_mode.setter
     def trigger_mode(self, mode):
         self.write('TRIGGER:SWEEP {}'.format(mode))
+        self._remember('trigger_mode', mode)
 
     @property
     def trigger_type(self):
-        return self.ask('TRIGGER:MODE?')
+        return self._cached('trigger_type', lambda: self.ask('TRIGGER:MODE?'))
 
     @trigger_type.setter
     def trigger_type(self, ttype):
+        self._remember('trigger_type', ttype)
         return self.write('TRIGGER:MODE {}'.format(ttype))
 
     @property
@@ -115,22 +234,26 @@ class DS1054(Instrument):
     @property
     def trigger_level(self):
         ttype = self.trigger_type
-        return float(self.ask('TRIGGER:{}:LEVEL?'.format(ttype)))
+        return self._cached(('trigger_level', ttype.upper()),
+                            lambda: float(self.ask('TRIGGER:{}:LEVEL?'.format(ttype))))
 
     @trigger_level.setter
     def trigger_level(self, level):
         ttype = self.trigger_type
         self.write('TRIGGER:{}:LEVEL {}'.format(ttype, level))
+        self._remember(('trigger_level', ttype.upper()), float(level))
 
     @property
     def trigger_source(self):
         ttype = self.trigger_type
-        return self.ask('TRIGGER:{}:SOURCE?'.format(ttype))
+        return self._cached(('trigger_source', ttype.upper()),
+                            lambda: self.ask('TRIGGER:{}:SOURCE?'.format(ttype)))
 
     @trigger_source.setter
     def trigger_source(self, src):
         ttype = self.trigger_type
         self.write('TRIGGER:{}:SOURCE {}'.format(ttype, src))
+        self._remember(('trigger_source', ttype.upper()), src)
 
     @property
     def measure_source(self):
@@ -189,10 +312,28 @@ class DS1054(Instrument):
         elif type(srcs) != list:
             srcs = list(srcs)
         res = self.ask('measure:item? {},{}'.format(item, ','.join(srcs)))
-        try:
-            return float(res)
-        except (ValueError, TypeError) as e:
-            return res
+        return _float_or_str(res)
+
+    def measure_many(self, items, srcs):
+        """
+        Measure every item of items on every source of srcs, see measure
+
+        The queries are joined with ';' into as few messages as fit in
+        INPUT_BUFFER. A source may be a tuple for the two source items (eg
+        RDELay). Returns a table as {src: {item: value}}.
+        """
+        if isinstance(items, StringTypes):
+            items = [items]
+        if isinstance(srcs, StringTypes):
+            srcs = [srcs]
+        cells = [(src, item) for src in srcs for item in items]
+        queries = [':measure:item? {},{}'.format(item, src if isinstance(src, StringTypes) else ','.join(src))
+                   for src, item in cells]
+        res = ask_many(self, queries, self.INPUT_BUFFER)
+        table = {src: {} for src in srcs}
+        for (src, item), r in zip(cells, res):
+            table[src][item] = _float_or_str(r)
+        return table
     
     @property
     def stats_mode(self):
@@ -221,23 +362,27 @@ class DS1054(Instrument):
 
     @property
     def sample_rate(self):
-        return float(self.ask(':waveform:xincrement?'))
+        return self.preamble().x_increment
 
     @property
     def timebase(self):
-        return float(self.ask(':timebase:main:scale?'))
+        return self._cached('timebase', lambda: float(self.ask(':timebase:main:scale?')))
 
     @timebase.setter
     def timebase(self, scale):
+        self.invalidate_preamble()
         self.write(':timebase:main:scale {}'.format(scale))
+        self._remember('timebase', float(scale))
 
     @property
     def timebase_offset(self):
-        return float(self.ask(':timebase:main:offset?'))
+        return self._cached('timebase_offset', lambda: float(self.ask(':timebase:main:offset?')))
 
     @timebase_offset.setter
     def timebase_offset(self, offset):
+        self.invalidate_preamble()
         self.write(':timebase:main:offset {}'.format(offset))
+        self._remember('timebase_offset', float(offset))
 
     @property
     def averages(self):
@@ -268,73 +413,311 @@ class DS1054(Instrument):
 
     @mem_depth.setter
     def mem_depth(self, mdepth):
+        self.invalidate_preamble()
         return self.write(':acquire:mdepth {}'.format(int(mdepth)))
 
+    @property
+    def wav_source(self):
+        return self.ask(':wav:source?')
+
+    @wav_source.setter
+    def wav_source(self, src):
+        self._set_wav('SOURCE', src)
+
+    def _set_wav(self, key, value):
+        """ write a :WAV setting and remember it as part of the preamble cache key """
+        self.write('WAV:{} {}'.format(key, value))
+        self._wav[key] = str(value).upper()
+
+    def invalidate_preamble(self):
+        """ forget all cached preambles, the next preamble() asks the scope again """
+        self._preamble.clear()
+
+    def preamble(self):
+        """
+        Return the Preamble of the current :WAV:SOURCE, MODE and FORMAT in a
+        single :WAV:PREamble? query
+
+        The result is cached per source until the scope is started or stopped
+        or the timebase, channel scale or memory depth is changed through this
+        driver, call invalidate_preamble() after changing them any other way.
+        """
+        key = (self._wav['SOURCE'], self._wav['MODE'], self._wav['FORMAT'])
+        pre = self._preamble.get(key)
+        if pre is None:
+            pre = self._preamble[key] = Preamble.parse(self.ask(':WAV:PREamble?'))
+        return pre
+
     @property
     def x_origin(self):
-        return float(self.ask(':wav:xorigin?'))
+        return self.preamble().x_origin
 
     @property
     def x_reference(self):
-        return float(self.ask(':wav:xreference?'))
+        return self.preamble().x_reference
 
     @property
     def x_increment(self):
-        return float(self.ask(':wav:xincrement?'))
+        return self.preamble().x_increment
 
     @property
     def y_origin(self):
-        return float(self.ask(':wav:yorigin?'))
+        return self.preamble().y_origin
 
     @property
     def y_reference(self):
-        return float(self.ask(':wav:yreference?'))
+        return self.preamble().y_reference
 
     @property
     def y_increment(self):
-        return float(self.ask(':wav:yincrement?'))
+        return self.preamble().y_increment
 
-    def get_trace(self, chan=None, batch=False):
-        # ensure we are in ascii mode as we only support this mode need this mode
+    def _setup_wav(self, chan, fmt):
+        """ select the source and raw format then stop the scope, returns the raw sample dtype """
+        raw_dtype = np.dtype(WAV_DTYPES[fmt.upper()])
         if chan:
-             self.write('WAV:SOURCE CHAN{}'.format(chan))
+            self._set_wav('SOURCE', 'CHAN{}'.format(chan))
+        self._set_wav('MODE', 'MAX')
+        self._set_wav('FORMAT', fmt)
+        self.stop()
+        return raw_dtype
+
+    def _iter_raw(self, raw_dtype, start, points, chunk_points):
+        """ yield (offset, raw samples) for each WAV:DATA? block of a stopped scope """
+        chunk_points = min(chunk_points, 250000 // raw_dtype.itemsize)
+        end = start + points
+        for m in range(start, end, chunk_points):
+            with self.instr.lock:
+                self.write('WAV:START {}'.format(m))
+                self.write('WAV:STOP {}'.format(min(m + chunk_points, end) - 1))
+                data = self.ask_raw('WAV:DATA?', num=chunk_points * raw_dtype.itemsize + 256)
+            yield m - start, np.frombuffer(parse_block(data), dtype=raw_dtype)
+
+    def _iter_scaled(self, raw_dtype, pre, start, points, chunk_points, dtype, out):
+        """ yield (offset, chunk) of _iter_raw scaled to volts with the preamble pre """
+        y_offset = pre.y_origin + pre.y_reference
+        for offset, raw in self._iter_raw(raw_dtype, start, points, chunk_points):
+            if out is None:
+                chunk = np.empty(raw.size, dtype=dtype)
+            else:
+                chunk = out[offset:offset + raw.size]
+            np.subtract(raw, y_offset, out=chunk)
+            chunk *= pre.y_increment
+            yield offset, chunk
+
+    def iter_trace(self, chan=None, chunk_points=250000, fmt='BYTE', dtype=np.float64,
+                   start=1, points=None, out=None):
+        """
+        Stop the scope and yield (offset, chunk) pairs of the waveform memory
+        of chan (or the current :WAV:SOURCE) as each WAV:DATA? block arrives
+
+        chunk_points is capped at the scope's per-read limit for <fmt>
+        (BYTE|WORD) and points defaults to the whole memory depth from start.
+        When out is given each chunk is decoded into out[offset:] rather than
+        a new array. The scope is set running again once the generator is
+        exhausted or closed.
+        """
+        raw_dtype = self._setup_wav(chan, fmt)
+        try:
+            pre = self.preamble()
+            if points is None:
+                points = pre.points - start + 1
+            for offset, chunk in self._iter_scaled(raw_dtype, pre, start, points, chunk_points, dtype, out):
+                yield offset, chunk
+        finally:
+            self.run()
 
+    def capture(self, path, chan=None, fmt='BYTE', chunk_points=250000):
+        """
+        Stop the scope and stream the raw <fmt> (BYTE|WORD) samples of the
+        whole memory of chan straight into a np.memmap file at path
+
+        The scaling parameters are saved in a json sidecar next to it
+        (path + '.json'), returns the saved trace as load_capture(path).
+        """
+        raw_dtype = self._setup_wav(chan, fmt)
+        try:
+            pre = self.preamble()
+            points = pre.points
+            meta = {k: getattr(pre, k) for k in CAPTURE_PARAMS}
+            raw = np.memmap(path, dtype=raw_dtype, mode='w+', shape=(points,))
+            n = 0
+            for offset, chunk in self._iter_raw(raw_dtype, 1, points, chunk_points):
+                raw[offset:offset + chunk.size] = chunk
+                n = offset + chunk.size
+            raw.flush()
+            del raw
+        finally:
+            self.run()
+        if n < points:
+            with open(path, 'r+b') as f:
+                f.truncate(n * raw_dtype.itemsize)
+        meta.update(fmt=fmt.upper(), points=n)
+        with open(path + '.json', 'w') as f:
+            json.dump(meta, f, indent=2)
+        return load_capture(path)
+
+    def get_trace(self, chan=None, batch=False, fmt='BYTE', dtype=np.float64, as_list=False):
+        """
+        Read the waveform of chan (or the current :WAV:SOURCE) as a numpy array
+
+        When batch is False the screen waveform is read in ASCII mode,
+        otherwise the scope is stopped and the whole of memory is read in
+        <fmt> (BYTE|WORD) mode and scaled to volts in one vectorised pass,
+        see iter_trace to process deep memory a chunk at a time.
+
+        Returns (trace, x_increment), pass as_list=True for the legacy python
+        list of floats instead of an ndarray.
+        """
         if not batch:
-            self.write('WAV:MODE NORMAL')
-            self.write('WAV:FORMAT ASCII')
+            if chan:
+                self._set_wav('SOURCE', 'CHAN{}'.format(chan))
+            self._set_wav('MODE', 'NORMAL')
+            self._set_wav('FORMAT', 'ASCII')
             trace = self.ask('WAV:DATA?').split(',')[1:]  # the manual is not clear what the first value is 
-            return [float(t) for t in trace], scope.sample_rate
+            trace = np.array(trace, dtype=dtype)
+            ts = self.preamble().x_increment
         else:
-            self.write('WAV:MODE MAX')
-            self.write('WAV:FORMAT BYTE')
-            y_origin = self.y_origin
-            max_pts = 250000
-            self.stop()
-            mem_depth = self.mem_depth
-            trace = []
-            for m in range(1, mem_depth, max_pts):
-                self.write('WAV:START {}'.format(m))
-                remaining = mem_depth - len(trace)
-                if remaining < max_pts:
-                    self.write('WAV:STOP {}'.format(m + remaining - 1))
-                else:
-                    self.write('WAV:STOP {}'.format(m + max_pts - 1))
-                data = self.ask_raw('WAV:DATA?', num=max_pts + 256)
-                y_origin = self.y_origin
-                y_reference = self.y_reference
-                y_increment = self.y_increment
-                trace += [(y - y_origin - y_reference) * y_increment
-                            for y in bytearray(data)[12:]]
-                remaining -= len(data[12:])
-            ts = self.sample_rate
+            raw_dtype = self._setup_wav(chan, fmt)
+            try:
+                pre = self.preamble()
+                trace = np.empty(pre.points, dtype=dtype)
+                n = 0
+                for offset, chunk in self._iter_scaled(raw_dtype, pre, 1, pre.points, 250000, dtype, trace):
+                    n = offset + chunk.size
+                trace = trace[:n]
+                ts = pre.x_increment
+            finally:
+                self.run()
+        if as_list:
+            return trace.tolist(), ts
+        return trace, ts
+
+    def _read_raw_traces(self, chans, raw_dtype, start=1, points=None):
+        """ read the raw start/points window of each of chans from a stopped scope """
+        raw = None
+        pres = []
+        for row, chan in enumerate(chans):
+            self._set_wav('SOURCE', 'CHAN{}'.format(chan))
+            pre = self.preamble()
+            if raw is None:
+                if points is None:
+                    points = pre.points - start + 1
+                raw = np.empty((len(chans), points), dtype=raw_dtype)
+            pres.append(pre)
+            for offset, chunk in self._iter_raw(raw_dtype, start, points, 250000):
+                raw[row, offset:offset + chunk.size] = chunk
+        return raw, pres
+
+    def get_traces(self, chans=(1, 2, 3, 4), fmt='BYTE', dtype=np.float64):
+        """
+        Stop the scope once and read the whole memory of every channel in
+        chans from the same acquisition
+
+        Returns (traces, t) where traces is a (len(chans), points) array in
+        volts, decoded in one pass, and t is the common time axis.
+        """
+        raw_dtype = self._setup_wav(None, fmt)
+        try:
+            raw, pres = self._read_raw_traces(chans, raw_dtype)
+        finally:
             self.run()
-            return trace, ts
+        return _scale_traces(raw, pres, 1, dtype)
+
+    def wait_trigger(self, timeout=None, poll=0.001, max_poll=0.05, cancel=None):
+        """
+        Poll TRIGGER:STATUS until a single shot has triggered and stopped,
+        doubling the poll interval up to max_poll seconds
 
-    def auto(self, wait=True):
+        Returns False if timeout seconds pass or the threading.Event cancel
+        is set first.
+        """
+        deadline = None if timeout is None else time() + timeout
+        while self.trigger_status != 'STOP':
+            if deadline is not None and time() > deadline:
+                return False
+            if cancel is None:
+                sleep(poll)
+            elif cancel.wait(poll):
+                return False
+            poll = min(poll * 2, max_poll)
+        return True
+
+    def acquire_loop(self, n, chans=(1,), points=None, start=1, fmt='BYTE', dtype=np.float64,
+                     queue_size=4, timeout=None):
+        """
+        Capture n single shot acquisitions of chans and yield each as
+        (traces, t), see get_traces
+
+        A background thread arms the scope, waits for the trigger, reads only
+        the start/points window of each channel and re-arms before decoding.
+        Captures are handed over through a queue of queue_size so a slow
+        consumer holds off acquisition rather than buffering without bound.
+        Don't use the scope from the consumer until the loop is done, the
+        achieved waveforms per second are left in self.acquire_stats.
+        """
+        captures = Queue(queue_size)
+        done = threading.Event()
+        stats = self.acquire_stats = {'captures': 0, 'elapsed': 0.0, 'rate': 0.0}
+
+        def put(item):
+            while not done.is_set():
+                try:
+                    captures.put(item, timeout=0.1)
+                    return True
+                except Full:
+                    pass
+            return False
+
+        def acquire():
+            t0 = time()
+            try:
+                raw_dtype = self._setup_wav(None, fmt)
+                self.single()
+                for i in range(n):
+                    if not self.wait_trigger(timeout, cancel=done):
+                        if done.is_set():
+                            return  # the consumer closed the loop
+                        raise RuntimeError('timed out waiting for trigger')
+                    raw, pres = self._read_raw_traces(chans, raw_dtype, start, points)
+                    if i + 1 < n:
+                        self.single()
+                    stats['captures'] = i + 1
+                    stats['elapsed'] = time() - t0
+                    stats['rate'] = stats['captures'] / stats['elapsed']
+                    if not put(_scale_traces(raw, pres, start, dtype)):
+                        return
+                put(None)
+            except Exception as e:
+                put(e)
+            finally:
+                self.run()
+
+        thread = threading.Thread(target=acquire)
+        thread.daemon = True
+        thread.start()
+        try:
+            while True:
+                item = captures.get()
+                if item is None:
+                    break
+                elif isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            done.set()
+            thread.join(1.0)
+            if thread.is_alive():
+                # still busy reading, stopping the scope ends any trigger wait
+                self.stop()
+                thread.join()
+            logging.info('acquired %d captures at %.1f wfm/s', stats['captures'], stats['rate'])
+
+    def auto(self, wait=True, timeout=10.0):
+        self.invalidate()
         self.write(':AUTOSCALE')
         if wait:
-            while not self.opc:
-                sleep(0.1)
+            self.wait(timeout)
 
     def vauto(self):
         """ auto the vertical scale """
@@ -359,23 +742,33 @@ class DS1054Channel(object):
 
     @property
     def scale(self):
-        return float(self.parent.ask(':channel{}:scale?'.format(self.ch)))
+        return self.parent._cached(('scale', self.ch),
+                                   lambda: float(self.parent.ask(':channel{}:scale?'.format(self.ch))))
 
     @scale.setter
     def scale(self, s):
+        self.parent.invalidate_preamble()
+        self.parent._remember(('scale', self.ch), float(s))
         return self.parent.write(':channel{}:scale {}'.format(self.ch, s))
 
     @property
     def bandwidth(self):
         return {
-            'set': self.parent.ask(':channel{}:bwlimit?'.format(self.ch)),
+            'set': self.parent._cached(('bandwidth', self.ch),
+                                       lambda: self.parent.ask(':channel{}:bwlimit?'.format(self.ch))),
             'options': ['OFF', '20M'],
         }
 
     @bandwidth.setter
     def bandwidth(self, bw):
+        self.parent._remember(('bandwidth', self.ch), bw)
         return self.parent.write(':channel{}:bwlimit {}'.format(self.ch, bw))
 
+    def invalidate(self):
+        """ drop the cached settings of this channel """
+        self.parent._forget(('scale', self.ch))
+        self.parent._forget(('bandwidth', self.ch))
+
     def measure(self, item):
         """
         Measure any waveform parameter of the specified source, or query the
@@ -390,3 +783,8 @@ class DS1054Channel(object):
         """
         return self.parent.measure(item, 'CHAN{}'.format(self.ch))
 
+    def measure_many(self, items):
+        """ measure every item of items on this channel, returns {item: value} """
+        src = 'CHAN{}'.format(self.ch)
+        return self.parent.measure_many(items, [src])[src]
+
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+"""
+Raw TCP socket SCPI backend for LAN instruments (port 5555 on Rigol kit)
+
+Messages are newline terminated and IEEE 488.2 definite length blocks
+(#NXXXX...) are read by length, which avoids the ONC-RPC framing of
+VXI-11. Select it with backends=['raw_socket'] and a dev string such as
+'TCPIP::192.168.1.10::5555::SOCKET', '192.168.1.10' or '192.168.1.10:5555'.
+"""
+import socket
+from time import time
+
+
+DEFAULT_PORT = 5555
+# kernel receive buffer, big enough to keep a deep memory read streaming
+RECV_BUFFER = 4 * 1024 * 1024
+# most read outside of a block, recv allocates this much on every call so
+# keep it small, blocks are read straight into their payload instead
+RECV_SIZE = 65536
+
+
+def parse_dev(dev):
+    """ return (host, port) of a raw socket dev string """
+    if '::' in dev:
+        parts = dev.split('::')
+        if not parts[0].upper().startswith('TCPIP'):
+            raise ValueError('{} is not a TCPIP resource'.format(dev))
+        host = parts[1]
+        port = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else DEFAULT_PORT
+    elif ':' in dev:
+        host, port = dev.rsplit(':', 1)
+        port = int(port)
+    else:
+        host, port = dev, DEFAULT_PORT
+    return host, port
+
+
+class Instrument(object):
+    """ same query/write api as the universal_usbtmc backends """
+
+    def __init__(self, dev, timeout=5.0, connect_timeout=2.0):
+        self.dev = dev
+        self.host, self.port = parse_dev(dev)
+        self.sock = socket.create_connection((self.host, self.port), connect_timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECV_BUFFER)
+        self.timeout = timeout
+        self._buf = bytearray()
+
+    @property
+    def timeout(self):
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, timeout):
+        self._timeout = timeout
+        self.sock.settimeout(timeout)
+
+    def close(self):
+        self.sock.close()
+
+    def write_raw(self, data):
+        if not data.endswith(b'\n'):
+            data += b'\n'
+        self.sock.sendall(data)
+
+    def write(self, message, encoding='utf-8'):
+        self.write_raw(message.encode(encoding))
+
+    def _recv(self):
+        data = self.sock.recv(RECV_SIZE)
+        if not data:
+            raise IOError('connection to {} closed'.format(self.dev))
+        self._buf += data
+
+    def _take(self, n):
+        while len(self._buf) < n:
+            self._recv()
+        data = bytes(self._buf[:n])
+        del self._buf[:n]
+        return data
+
+    def _read_block(self):
+        """ read the rest of a definite length block once its '#' has arrived """
+        header = self._take(2)
+        n = int(header[1:2])
+        length = self._take(n)
+        payload = bytearray(int(length))
+        view = memoryview(payload)
+        got = min(len(self._buf), len(payload))
+        view[:got] = self._buf[:got]
+        del self._buf[:got]
+        while got < len(payload):
+            r = self.sock.recv_into(view[got:])
+            if not r:
+                raise IOError('connection to {} closed'.format(self.dev))
+            got += r
+        # swallow the message terminator
+        while not self._buf:
+            self._recv()
+        if self._buf[:1] == b'\n':
+            del self._buf[:1]
+        return header + length + bytes(payload)
+
+    def read_raw(self, num=-1):
+        while not self._buf:
+            self._recv()
+        if self._buf[:1] == b'#':
+            return self._read_block()
+        while True:
+            end = self._buf.find(b'\n')
+            if end >= 0:
+                data = bytes(self._buf[:end + 1])
+                del self._buf[:end + 1]
+                return data
+            self._recv()
+
+    def read(self, num=-1, encoding='utf-8'):
+        return self.read_raw(num).decode(encoding).rstrip('\r\n')
+
+    def query_raw(self, message, num=-1):
+        self.write(message)
+        return self.read_raw(num)
+
+    def query(self, message, num=-1, encoding='utf-8'):
+        self.write(message)
+        return self.read(num, encoding)
+
+
+def benchmark(dev=None, n=1000, blocks=20, block_size=250000):
+    """
+    Time n *OPC? round trips and blocks WAV:DATA? transfers of dev, or of a
+    simulated DS1054 served on localhost (see eedlab.sim) reading blocks of
+    block_size (up to 250000) points when dev is None. Returns (latency s,
+    MB/s), the simulated transfers include generating the samples.
+    """
+    server = None
+    if dev is None:
+        from .sim import serve
+        server = serve('DS1054', port=0)
+        for header, value in (('ACQUIRE:MDEPTH', block_size), ('WAVEFORM:MODE', 'RAW'),
+                              ('WAVEFORM:FORMAT', 'BYTE'), ('WAVEFORM:START', 1),
+                              ('WAVEFORM:STOP', block_size)):
+            server.sim.set_value(header, value)
+        server.sim.running = False
+        dev = server.dev
+    instr = Instrument(dev)
+    t0 = time()
+    for _ in range(n):
+        instr.query('*OPC?')
+    latency = (time() - t0) / n
+    t0 = time()
+    size = 0
+    for _ in range(blocks):
+        size += len(instr.query_raw('WAV:DATA?'))
+    rate = size / (time() - t0) / 1e6
+    instr.close()
+    if server is not None:
+        server.close()
+    return latency, rate
+
+
+if __name__ == '__main__':
+    import sys
+    latency, rate = benchmark(sys.argv[1] if len(sys.argv) > 1 else None)
+    print('round trip {:.1f} us, block transfer {:.1f} MB/s'.format(latency * 1e6, rate))
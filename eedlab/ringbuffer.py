@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""
+Bounded numpy storage and running statistics for long instrument logs
+"""
+import numpy as np
+
+
+class RingBuffer(object):
+    """
+    Fixed size ring buffer of rows with columns values each
+
+    Every row is written twice, so the latest n rows are always contiguous
+    and latest() can return a view rather than a copy.
+    """
+    def __init__(self, size, columns=1, dtype=np.float64):
+        self.size = size
+        self.columns = columns
+        self.data = np.zeros((2 * size, columns), dtype=dtype)
+        self.count = 0  # rows ever written
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def extend(self, rows):
+        rows = np.asarray(rows).reshape(-1, self.columns)
+        k = len(rows)
+        if k > self.size:
+            rows = rows[-self.size:]
+        i = (self.count + k - len(rows)) % self.size
+        first = min(len(rows), self.size - i)
+        for base in (0, self.size):
+            self.data[base + i:base + i + first] = rows[:first]
+            self.data[base:base + len(rows) - first] = rows[first:]
+        self.count += k
+
+    def append(self, row):
+        self.extend([row])
+
+    def latest(self, n=None):
+        """ view of the latest n rows (default all), oldest first, until they are overwritten """
+        n = len(self) if n is None else min(n, len(self))
+        end = self.count % self.size + self.size
+        return self.data[end - n:end]
+
+
+class RunningStats(object):
+    """
+    Running count, mean, variance, min and max of each column, updated per
+    block in O(1) memory with Welford's (Chan's parallel) algorithm
+    """
+    def __init__(self, columns=1):
+        self.n = 0
+        self.mean = np.zeros(columns)
+        self._m2 = np.zeros(columns)
+        self.min = np.full(columns, np.inf)
+        self.max = np.full(columns, -np.inf)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).reshape(-1, len(self.mean))
+        k = len(values)
+        if not k:
+            return
+        mean = values.mean(axis=0)
+        m2 = ((values - mean) ** 2).sum(axis=0)
+        n = self.n + k
+        delta = mean - self.mean
+        self.mean = self.mean + delta * k / n
+        self._m2 = self._m2 + m2 + delta ** 2 * self.n * k / n
+        self.n = n
+        self.min = np.minimum(self.min, values.min(axis=0))
+        self.max = np.maximum(self.max, values.max(axis=0))
+
+    @property
+    def variance(self):
+        if self.n < 2:
+            return np.zeros_like(self._m2)
+        return self._m2 / (self.n - 1)
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+    def as_dict(self):
+        return {
+            'n': self.n,
+            'mean': self.mean.copy(),
+            'variance': self.variance,
+            'min': self.min.copy(),
+            'max': self.max.copy(),
+        }
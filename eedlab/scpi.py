@@ -0,0 +1,554 @@
+#!/usr/bin/env python
+"""
+Helpers shared by the SCPI instrument drivers
+"""
+from time import sleep, time
+from importlib import import_module
+from sys import platform
+try:
+    from types import StringTypes
+except ImportError:
+    StringTypes = (str,)
+try:
+    from collections.abc import Iterable
+except ImportError:
+    from collections import Iterable
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+
+# backends provided by eedlab rather than universal_usbtmc, all backends
+# are only imported once selected
+BACKENDS = {
+    'raw_socket': '.raw_socket',
+    'sim': '.sim',
+}
+
+
+# where connect() remembers the backend and *IDN? that worked for each dev
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'eedlab', 'backends.json')
+
+
+class ScpiTimeout(IOError):
+    pass
+
+
+class ScpiError(IOError):
+    """ raised with the entries drained from an instrument's error queue """
+    def __init__(self, errors):
+        super(ScpiError, self).__init__('; '.join('{} {}'.format(code, msg) for code, msg in errors))
+        self.errors = errors
+
+
+class LazyModule(object):
+    """ stands in for the module name and imports it when first used """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = import_module(self._name)
+        return getattr(self._module, attr)
+
+
+def import_backend(name):
+    """ import_backend of universal_usbtmc that also knows the eedlab BACKENDS """
+    if name in BACKENDS:
+        return import_module(BACKENDS[name], __package__)
+    from universal_usbtmc import import_backend
+    return import_backend(name)
+
+
+class _Pending(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class Deferred(object):
+    """
+    Reply of a query queued in a Session.batch, available as value once the
+    batch is flushed. Using it as a string or number before then flushes
+    the batch early.
+    """
+    def __init__(self, session, fn=None):
+        self._session = session
+        self._fn = fn
+        self._pending = _Pending()
+
+    def _resolve(self, result=None, error=None):
+        if error is None and self._fn is not None:
+            result = self._fn(result)
+        self._pending.result = result
+        self._pending.error = error
+        self._pending.done.set()
+
+    def then(self, fn):
+        """ Deferred of fn applied to this reply """
+        d = Deferred(self._session)
+        if self.ready:
+            d._resolve(fn(self.value))
+        else:
+            self._session._batch.append((None, self, d, fn))
+        return d
+
+    @property
+    def ready(self):
+        return self._pending.done.is_set()
+
+    @property
+    def value(self):
+        if not self.ready:
+            self._session.flush()
+        return self._pending.wait()
+
+    def __str__(self):
+        return str(self.value)
+
+    def __float__(self):
+        return float(self.value)
+
+    def __int__(self):
+        return int(self.value)
+
+    def __eq__(self, other):
+        return self.value == other
+
+    def __ne__(self, other):
+        return self.value != other
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.value, name)
+
+    def __repr__(self):
+        return '<Deferred {}>'.format(repr(self._pending.result) if self.ready else 'pending')
+
+
+def post(res, fn):
+    """ fn(res), or a Deferred of it when res is still Deferred """
+    return res.then(fn) if isinstance(res, Deferred) else fn(res)
+
+
+class _Lock(object):
+    """ re-entrant lock that knows whether the current thread holds it """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._owner = None
+        self._count = 0
+
+    def acquire(self, blocking=True):
+        if not self._lock.acquire(blocking):
+            return False
+        self._owner = threading.current_thread()
+        self._count += 1
+        return True
+
+    def release(self):
+        self._count -= 1
+        if not self._count:
+            self._owner = None
+        self._lock.release()
+
+    def owned(self):
+        return self._owner is threading.current_thread()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class Session(object):
+    """
+    Thread safe wrapper of a backend instrument
+
+    Every write or query is one atomic transaction on the bus, hold lock to
+    keep a sequence of them together. Threads asking the same query while
+    an identical one is on the bus share its reply rather than sending it
+    again, unless coalesce is False or they hold lock themselves. Anything
+    else is passed through to the backend.
+
+    Within a batch writes and queries are queued and sent when it ends, see
+    batch.
+    """
+    def __init__(self, instr, coalesce=True):
+        self.__dict__.update(instr=instr, coalesce=coalesce, lock=_Lock(),
+                             _pending={}, _pending_lock=threading.Lock(),
+                             _batch=None, _batch_len=None, _batch_thread=None)
+
+    def __getattr__(self, name):
+        return getattr(self.instr, name)
+
+    def __setattr__(self, name, value):
+        if name in self.__dict__:
+            self.__dict__[name] = value
+        else:
+            setattr(self.instr, name, value)
+
+    def write(self, message, *args, **kwargs):
+        with self.lock:
+            if self._batch is not None:
+                self._batch.append((message, None, None, None))
+                return
+            return self.instr.write(message, *args, **kwargs)
+
+    def _in_batch(self):
+        return self._batch_thread is threading.current_thread()
+
+    @contextmanager
+    def batch(self, max_len=256):
+        """
+        Hold the session and queue every write and query until the block
+        ends, then send them as ';' joined messages of at most max_len
+        characters. Queries return a Deferred resolved from the reply of
+        the message they went out in.
+        """
+        with self.lock:
+            if self._batch is not None:
+                yield self  # nested, the outer batch flushes
+                return
+            self._batch = []
+            self._batch_len = max_len
+            self._batch_thread = threading.current_thread()
+            try:
+                yield self
+                self.flush()
+            finally:
+                queued = self._batch
+                self._batch = self._batch_thread = None
+                for _, _, d, _ in queued:
+                    if d is not None:
+                        d._resolve(error=IOError('batch abandoned before it was sent'))
+
+    def flush(self):
+        """ send everything queued in the current batch """
+        with self.lock:
+            queued, self._batch[:] = list(self._batch), []
+            group = []
+            size = 0
+            for item in queued:
+                message = item[0]
+                if message is None:
+                    group.append(item)  # a then() of an earlier reply
+                    continue
+                if not message.startswith((':', '*')):
+                    message = ':' + message  # back to the root of the command tree
+                if group and size + 1 + len(message) > self._batch_len:
+                    self._send(group)
+                    group = []
+                    size = 0
+                size += len(message) + (1 if size else 0)
+                group.append((message,) + item[1:])
+            if group:
+                self._send(group)
+
+    def _send(self, group):
+        messages = [item for item in group if item[0] is not None]
+        # a queued query may itself be several ';' joined queries (ask_many),
+        # its Deferred gets as many replies as it has query headers
+        queries = [(d, _count_queries(message)) for message, _, d, _ in messages if d is not None]
+        msg = ';'.join(message for message, _, _, _ in messages)
+        if not queries:
+            if msg:
+                self.instr.write(msg)
+        else:
+            try:
+                replies = self.instr.query(msg).split(';')
+            except Exception as e:
+                for d, _ in queries:
+                    d._resolve(error=e)
+            else:
+                i = 0
+                for d, n in queries:
+                    if i + n > len(replies):
+                        d._resolve(error=IOError('no reply to {}'.format(msg)))
+                    else:
+                        d._resolve(';'.join(r.strip() for r in replies[i:i + n]))
+                    i += n
+        for _, parent, d, fn in group:
+            if parent is not None:
+                try:
+                    d._resolve(fn(parent.value))
+                except Exception as e:
+                    d._resolve(error=e)
+
+    def write_raw(self, *args, **kwargs):
+        with self.lock:
+            if self._in_batch():
+                self.flush()  # keep it in order with what is queued
+            return self.instr.write_raw(*args, **kwargs)
+
+    def query(self, *args, **kwargs):
+        return self._transact('query', args, kwargs)
+
+    def query_raw(self, *args, **kwargs):
+        return self._transact('query_raw', args, kwargs)
+
+    def _transact(self, method, args, kwargs):
+        if method == 'query' and self._in_batch():
+            d = Deferred(self)
+            self._batch.append((args[0], None, d, None))
+            return d
+        if self._in_batch():
+            self.flush()
+        if not self.coalesce or self.lock.owned():
+            # the holder of lock never waits on another thread's query, that
+            # thread may be queued behind it for the lock
+            with self.lock:
+                return getattr(self.instr, method)(*args, **kwargs)
+        key = (method, args, tuple(sorted(kwargs.items())))
+        with self._pending_lock:
+            pending = self._pending.get(key)
+        if pending is not None:
+            return pending.wait()
+        with self.lock:
+            # only queries on the bus are in _pending, so there are none now
+            pending = _Pending()
+            with self._pending_lock:
+                self._pending[key] = pending
+            try:
+                pending.result = getattr(self.instr, method)(*args, **kwargs)
+            except Exception as e:
+                pending.error = e
+            finally:
+                with self._pending_lock:
+                    del self._pending[key]
+                pending.done.set()
+        return pending.wait()
+
+
+def _count_queries(message):
+    """ number of query headers, so replies, in a ';' joined message """
+    return sum(1 for cmd in message.split(';') if cmd.strip().split(' ', 1)[0].endswith('?'))
+
+
+def _load_cache():
+    try:
+        with open(CACHE_PATH) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def _save_cache(dev, be_name, idn):
+    cache = _load_cache()
+    cache[dev] = {'backend': be_name, 'idn': idn}
+    try:
+        if not os.path.isdir(os.path.dirname(CACHE_PATH)):
+            os.makedirs(os.path.dirname(CACHE_PATH))
+        with open(CACHE_PATH, 'w') as f:
+            json.dump(cache, f, indent=2)
+    except (IOError, OSError):
+        pass
+
+
+def _close(instr):
+    try:
+        instr.close()
+    except Exception:
+        pass
+
+
+# backends that talk to the same USB device, python_usbtmc detaches the
+# kernel usbtmc driver under linux_kernel so these are never probed at once
+USB_BACKENDS = ('linux_kernel', 'python_usbtmc')
+
+# seconds a backend has to answer the *IDN? of a connect probe
+PROBE_TIMEOUT = 1.0
+
+
+def _open(dev, be_name, timeout=None):
+    """ open dev with be_name and check it answers *IDN?, within timeout seconds if given """
+    be = import_backend(be_name)
+    instr = be.Instrument(dev)
+    io_timeout = getattr(instr, 'timeout', None)
+    if timeout is not None and io_timeout is not None:
+        instr.timeout = min(io_timeout, timeout)
+    try:
+        idn = instr.query('*IDN?')
+    except Exception:
+        _close(instr)
+        raise
+    if timeout is not None and io_timeout is not None:
+        instr.timeout = io_timeout
+    return instr, be, be_name, idn
+
+
+def resolve_backends(backends=None, defaults=('python_usbtmc',)):
+    """ list of backends to try, defaults with linux_kernel first on linux when backends is None """
+    if backends is None:
+        backends = list(defaults)
+        if "linux" in platform:
+            # this is a way better api to use than python_usbtmc, but but it only works on linux
+            backends.insert(0, 'linux_kernel')
+    elif not isinstance(backends, Iterable) or isinstance(backends, StringTypes):
+        backends = [backends]
+    return list(backends)
+
+
+def connect(dev, backends=None, defaults=('python_usbtmc',), timeout=PROBE_TIMEOUT, cache=True):
+    """
+    Open dev with the first of backends (see resolve_backends) that answers
+    *IDN?
+
+    The backend that last worked for dev is tried on its own first. Failing
+    that the candidates are probed concurrently, except the USB_BACKENDS
+    which are probed one after another, and the earliest in the list to
+    answer wins, the rest are closed. Each probe's I/O timeout is cut to
+    timeout seconds while it waits for *IDN?, so an absent backend early in
+    the list only holds up the rest that long, None keeps every backend's
+    own. Returns (Session of instr, backend module, backend name, idn).
+    """
+    backends = resolve_backends(backends, defaults)
+
+    cached = _load_cache().get(dev, {}).get('backend') if cache else None
+    if cached in backends:
+        try:
+            instr, be, be_name, idn = _open(dev, cached, timeout)
+            return Session(instr), be, be_name, idn
+        except Exception as e:
+            # I hate this generic error handling too, but the many backends
+            # can throw so many different exception types its just easier
+            # to try and if anything goes wrong then try the next backend
+            logging.debug('cached backend %s failed for %s: %s', cached, dev, e)
+
+    results = [None] * len(backends)
+    done = [threading.Event() for _ in backends]
+    lock = threading.Lock()
+    chosen = []
+
+    def probe(i):
+        try:
+            res = _open(dev, backends[i], timeout)
+        except Exception as e:
+            logging.debug('backend %s failed for %s: %s', backends[i], dev, e)
+            res = e
+        with lock:
+            results[i] = res
+            if chosen and isinstance(res, tuple) and res is not chosen[0]:
+                _close(res[0])  # lost the race after a winner was picked
+        done[i].set()
+
+    def probe_usb(indices):
+        for n, i in enumerate(indices):
+            probe(i)
+            if isinstance(results[i], tuple):
+                for j in indices[n + 1:]:
+                    results[j] = IOError('USB device already opened with {}'.format(backends[i]))
+                    done[j].set()
+                return
+
+    usb = [i for i, be_name in enumerate(backends) if be_name in USB_BACKENDS]
+    groups = [(probe, (i,)) for i, be_name in enumerate(backends) if be_name not in USB_BACKENDS]
+    if usb:
+        groups.append((probe_usb, (usb,)))
+    for target, args in groups:
+        thread = threading.Thread(target=target, args=args)
+        thread.daemon = True
+        thread.start()
+    for i in range(len(backends)):
+        # backends later in the list only win if every earlier one fails
+        done[i].wait()
+        with lock:
+            if isinstance(results[i], tuple):
+                chosen.append(results[i])
+                for res in results[i + 1:]:
+                    if isinstance(res, tuple):
+                        _close(res[0])
+                break
+    if not chosen:
+        from universal_usbtmc import UsbtmcError
+        raise UsbtmcError('no matching backends in {} connected using {}'.format(','.join(backends), dev))
+    instr, be, be_name, idn = chosen[0]
+    if cache:
+        _save_cache(dev, be_name, idn)
+    return Session(instr), be, be_name, idn
+
+
+def join_messages(cmds, max_len):
+    """ yield cmds joined with ';' into messages of at most max_len characters """
+    msg = ''
+    for cmd in cmds:
+        if msg and len(msg) + 1 + len(cmd) > max_len:
+            yield msg
+            msg = ''
+        msg = cmd if not msg else msg + ';' + cmd
+    if msg:
+        yield msg
+
+
+def ask_many(instr, queries, max_len):
+    """
+    Ask queries of instr (any driver with ask) joined with ';' into as few
+    messages of at most max_len characters as fit, returns the replies
+    """
+    res = []
+    for msg in join_messages(queries, max_len):
+        res += [r.strip() for r in instr.ask(msg).split(';')]
+    return res
+
+
+def drain_errors(instr, limit=100):
+    """ read :SYSTem:ERRor? until the queue is empty, returns a list of (code, message) """
+    errors = []
+    for _ in range(limit):
+        code, _, msg = instr.ask(':SYSTem:ERRor?').strip().partition(',')
+        if int(code) == 0:
+            break
+        errors.append((int(code), msg.strip().strip('"')))
+    return errors
+
+
+def wait_opc(instr, timeout=10.0, poll=0.001, max_poll=0.1, block=False):
+    """
+    Wait for all pending operations of instr (any driver with ask/write) to
+    complete
+
+    By default *OPC is sent and *ESR? polled, starting every poll seconds and
+    doubling up to max_poll so short operations return quickly and long ones
+    don't flood the bus. With block=True a single *OPC? is sent with the
+    backend's I/O timeout extended to timeout instead.
+
+    Returns the polled event status register, or the 1 *OPC? answers with
+    when blocking. Raises ScpiTimeout if the operation is still pending
+    after timeout seconds.
+    """
+    if block:
+        be = getattr(instr, 'instr', instr)
+        io_timeout = getattr(be, 'timeout', None)
+        if io_timeout is not None:
+            be.timeout = max(io_timeout, timeout)
+        try:
+            res = instr.ask('*OPC?')
+        except Exception as e:
+            raise ScpiTimeout('operation still pending after {}s ({})'.format(timeout, e))
+        finally:
+            if io_timeout is not None:
+                be.timeout = io_timeout
+        return int(res)
+
+    deadline = time() + timeout
+    instr.write('*OPC')
+    while True:
+        esr = int(instr.ask('*ESR?'))
+        if esr & 1:
+            return esr
+        if time() > deadline:
+            raise ScpiTimeout('operation still pending after {}s'.format(timeout))
+        sleep(poll)
+        poll = min(poll * 2, max_poll)
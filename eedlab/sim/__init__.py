@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Simulated DS1054, DP832, DM3058E and DG1022 for testing and benchmarking
+the drivers without the instruments
+
+As a backend (backends=['sim']) the dev string names the model and
+optionally the link to model, eg 'DS1054' or
+'SIM::DS1054::latency=0.0005::bandwidth=5e6' for 0.5 ms per write and per
+read (so 1 ms a query) and 5 MB/s. The drivers then run their real code paths, so round trips,
+throughput and decode cost can be measured on any machine:
+
+    scope = DS1054('SIM::DS1054::latency=0.0005', backends=['sim'])
+
+serve() runs the same models as a raw socket server on localhost for the
+raw_socket backend, see python -m eedlab.sim --help.
+"""
+from time import sleep
+
+from .core import Link
+from .dg1022 import DG1022
+from .dm3058e import DM3058E
+from .dp832 import DP832
+from .ds1054 import DS1054
+from .server import Server, serve
+from ..scpi import ScpiTimeout
+
+
+MODELS = {
+    'DS1054': DS1054,
+    'DP832': DP832,
+    'DM3058E': DM3058E,
+    'DG1022': DG1022,
+}
+
+
+def parse_dev(dev):
+    """ return (model, link options) of a sim dev string """
+    model = None
+    options = {}
+    for part in dev.split('::'):
+        if '=' in part:
+            key, value = part.split('=', 1)
+            options[key.strip().lower()] = float(value)
+        elif part.upper() != 'SIM':
+            model = part.upper()
+    if model not in MODELS:
+        raise ValueError('{} is not one of the simulated {}'.format(dev, sorted(MODELS)))
+    return model, options
+
+
+class Instrument(object):
+    """ in process backend with the same query/write api as the universal_usbtmc backends """
+
+    def __init__(self, dev, timeout=5.0):
+        self.dev = dev
+        model, options = parse_dev(dev)
+        self.sim = MODELS[model]()
+        self.link = Link(**options)
+        self.timeout = timeout
+        self._output = b''
+
+    def close(self):
+        pass
+
+    def write_raw(self, data):
+        self.link.transfer(len(data))
+        reply = self.sim.handle(data.rstrip(b'\n'))
+        if reply is not None:
+            self._output += reply
+
+    def write(self, message, encoding='utf-8'):
+        self.write_raw(message.encode(encoding))
+
+    def read_raw(self, num=-1):
+        if not self._output:
+            sleep(self.timeout)
+            raise ScpiTimeout('{} has nothing to read after {}s'.format(self.dev, self.timeout))
+        data, self._output = self._output, b''
+        self.link.transfer(len(data))
+        return data
+
+    def read(self, num=-1, encoding='utf-8'):
+        return self.read_raw(num).decode(encoding).rstrip('\r\n')
+
+    def query_raw(self, message, num=-1):
+        self.write(message)
+        return self.read_raw(num)
+
+    def query(self, message, num=-1, encoding='utf-8'):
+        self.write(message)
+        return self.read(num, encoding)
@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+"""
+python -m eedlab.sim serve <model> [port] [latency s] [bandwidth B/s]
+python -m eedlab.sim bench [dev] [backend]
+"""
+import sys
+
+from .bench import benchmark
+from .server import serve
+
+
+def main(argv):
+    if len(argv) > 1 and argv[0] == 'serve':
+        port, latency, bandwidth = (argv[2:] + [5555, 0.0, float('inf')][len(argv[2:]):])[:3]
+        server = serve(argv[1], '127.0.0.1', int(port), float(latency), float(bandwidth))
+        print('simulated {} on {}, ctrl-c to stop'.format(argv[1].upper(), server.dev))
+        try:
+            server._thread.join()
+        except KeyboardInterrupt:
+            server.close()
+    elif not argv or argv[0] == 'bench':
+        res = benchmark(*argv[1:2], backends=argv[2:3] or ['sim'])
+        print('round trip {:.1f} us'.format(res['round_trip'] * 1e6))
+        print('{} points in {:.3f} s, {:.1f} MB/s'.format(res['points'], res['read'], res['throughput'] / 1e6))
+        print('decode {:.2f} ns/point'.format(res['decode_per_point'] * 1e9))
+    else:
+        print(__doc__.strip())
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""
+Round trip, deep memory throughput and decode cost of the DS1054 driver
+against a simulated (or real) scope
+"""
+from time import time
+
+import numpy as np
+
+
+def benchmark(dev='SIM::DS1054', backends=('sim',), n=200, mem_depth=1200000, fmt='BYTE', decodes=20):
+    """
+    Time n *OPC? round trips, a get_trace of mem_depth points and the
+    numpy decode of one WAV:DATA? block through the DS1054 driver
+
+    In process the transfer time includes generating the simulated samples,
+    give the dev string a latency and bandwidth (see eedlab.sim) or use a
+    real scope for link bound numbers. Returns a dict of the results.
+    """
+    from ..ds1054 import DS1054, parse_block, WAV_DTYPES
+    scope = DS1054(dev, backends=list(backends))
+    t0 = time()
+    for _ in range(n):
+        scope.ask('*OPC?')
+    round_trip = (time() - t0) / n
+
+    scope.mem_depth = mem_depth
+    scope.single()
+    scope.wait_trigger(timeout=10.0)
+    t0 = time()
+    trace, _ = scope.get_trace(1, batch=True, fmt=fmt)
+    read = time() - t0
+    raw_dtype = np.dtype(WAV_DTYPES[fmt.upper()])
+
+    scope._setup_wav(1, fmt)
+    try:
+        pre = scope.preamble()
+        data = scope.ask_raw('WAV:DATA?')
+    finally:
+        scope.run()
+    t0 = time()
+    for _ in range(decodes):
+        raw = np.frombuffer(parse_block(data), dtype=raw_dtype)
+        volts = (raw - (pre.y_origin + pre.y_reference)) * pre.y_increment
+    decode = (time() - t0) / decodes / volts.size
+    scope.instr.close()
+    return {
+        'round_trip': round_trip,
+        'points': trace.size,
+        'read': read,
+        'throughput': trace.size * raw_dtype.itemsize / read,
+        'decode_per_point': decode,
+    }
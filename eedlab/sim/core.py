@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+"""
+SCPI parsing and the latency/bandwidth model shared by the simulated
+instruments
+"""
+import re
+from time import sleep
+
+
+def short_form(keyword):
+    """
+    Approximate SCPI short form of keyword, the first four letters or three
+    when the fourth is a vowel (VOLTAGE -> VOLT, WAVEFORM -> WAV), numeric
+    suffixes become '#'
+    """
+    m = re.match(r'(\*?[A-Z]+)(\d*)$', keyword.upper())
+    if m is None:
+        return keyword.upper()
+    name, num = m.groups()
+    if len(name) > 4:
+        name = name[:3] if name[3] in 'AEIOU' else name[:4]
+    return name + ('#' if num else '')
+
+
+_normalised = {}
+
+
+def normalise(header):
+    """ return (key, numbers) of a command header, eg 'source2:volt?' -> ('SOUR#:VOLT?', [2]) """
+    try:
+        return _normalised[header]
+    except KeyError:
+        pass
+    query = header.endswith('?')
+    keywords = [k for k in header.rstrip('?').lstrip(':').split(':') if k]
+    nums = [int(re.search(r'\d+$', k).group()) for k in keywords if re.search(r'[A-Za-z]\d+$', k)]
+    res = _normalised[header] = ':'.join(short_form(k) for k in keywords) + ('?' if query else ''), nums
+    return res
+
+
+def block(data):
+    """ IEEE 488.2 definite length block of data """
+    return '#9{:09d}'.format(len(data)).encode() + data
+
+
+def split_block(message):
+    """
+    Return (message up to its terminating newline, rest) of the bytes
+    message, skipping over any definite length block, or None when it is
+    incomplete
+    """
+    i = 0
+    while True:
+        nl = message.find(b'\n', i)
+        hash_ = message.find(b'#', i)
+        if nl < 0 and hash_ < 0:
+            return None
+        if hash_ < 0 or (0 <= nl < hash_):
+            return message[:nl], message[nl + 1:]
+        if len(message) < hash_ + 2:
+            return None
+        if not message[hash_ + 1:hash_ + 2].isdigit():
+            i = hash_ + 1
+            continue
+        n = int(message[hash_ + 1:hash_ + 2])
+        if len(message) < hash_ + 2 + n:
+            return None
+        i = hash_ + 2 + n + int(message[hash_ + 2:hash_ + 2 + n] or 0)
+        if len(message) < i:
+            return None
+
+
+class SimInstrument(object):
+    """
+    Base of the simulated instruments
+
+    Subclasses map headers to handlers in COMMANDS, a handler is called
+    with (nums, args) and returns the reply to a query as a str, or as
+    bytes sent verbatim (see block). Headers in SETTINGS are plain stored
+    values with a default, readable with value() and settable with the
+    command or set_value(). Unknown commands push an error onto the
+    :SYSTem:ERRor? queue like the real thing.
+    """
+    IDN = 'SIM,INSTRUMENT,0,0'
+    COMMANDS = {}
+    SETTINGS = {}
+
+    def __init__(self):
+        self.esr = 0
+        self.errors = []
+        self._commands = dict((normalise(k)[0], v) for k, v in SimInstrument.COMMON.items())
+        self._commands.update((normalise(k)[0], v) for k, v in self.COMMANDS.items())
+        self._defaults = dict((normalise(k)[0], str(v)) for k, v in self.SETTINGS.items())
+        self._values = {}
+
+    def error(self, code, msg):
+        self.errors.append('{},"{}"'.format(code, msg))
+
+    def value(self, header, *nums):
+        """ stored value of the SETTINGS header, eg value('CHANNEL2:SCALE') """
+        key, hnums = normalise(header)
+        return self._values.get((key, nums or tuple(hnums)), self._defaults[key])
+
+    def set_value(self, header, value, *nums):
+        key, hnums = normalise(header)
+        self._values[key, nums or tuple(hnums)] = str(value)
+
+    def handle(self, message):
+        """ process a whole message (bytes), returns the reply bytes or None for no reply """
+        replies = []
+        for cmd in self._split(message):
+            header, _, args = cmd.partition(b' ')
+            header = header.decode('ascii', 'replace').strip()
+            if not header:
+                continue
+            key, nums = normalise(header)
+            handler = self._commands.get(key) or self.fallback(key)
+            if handler is None:
+                self.error(-113, 'Undefined header')
+                continue
+            # args holding a definite length block are passed as raw bytes
+            if not re.search(br'(^|,)\s*#\d', args):
+                args = [a.strip() for a in args.decode('ascii', 'replace').split(',')] if args.strip() else []
+            try:
+                res = handler(self, nums, args)
+            except (ValueError, TypeError, IndexError, KeyError):
+                self.error(-222, 'Data out of range')
+                res = None
+            if key.endswith('?'):
+                replies.append(res if isinstance(res, bytes) else str(res).encode())
+        if not replies:
+            return None
+        return b';'.join(replies) + b'\n'
+
+    def fallback(self, key):
+        """ handler for key when it is not in COMMANDS, the SETTINGS get/set """
+        base = key.rstrip('?')
+        if base not in self._defaults:
+            return None
+        if key.endswith('?'):
+            return lambda self, nums, args: self.value(base, *nums)
+        return lambda self, nums, args: self.set_value(base, ','.join(args), *nums)
+
+    @staticmethod
+    def _split(message):
+        """ split a message on ';' except inside a definite length block """
+        cmds = []
+        start = i = 0
+        while i < len(message):
+            c = message[i:i + 1]
+            if c == b'#' and i + 1 < len(message) and message[i + 1:i + 2].isdigit():
+                n = int(message[i + 1:i + 2])
+                i += 2 + n + int(message[i + 2:i + 2 + n] or 0)
+                continue
+            if c == b';':
+                cmds.append(message[start:i])
+                start = i + 1
+            i += 1
+        cmds.append(message[start:])
+        return [c.strip() for c in cmds]
+
+    def _idn(self, nums, args):
+        return self.IDN
+
+    def _opc_query(self, nums, args):
+        return '1'
+
+    def _opc(self, nums, args):
+        self.esr |= 1
+
+    def _esr(self, nums, args):
+        esr, self.esr = self.esr, 0
+        return str(esr)
+
+    def _err(self, nums, args):
+        return self.errors.pop(0) if self.errors else '0,"No error"'
+
+    def _cls(self, nums, args):
+        self.esr = 0
+        del self.errors[:]
+
+    COMMON = {
+        '*IDN?': _idn,
+        '*OPC?': _opc_query,
+        '*OPC': _opc,
+        '*ESR?': _esr,
+        '*CLS': _cls,
+        'SYSTEM:ERROR?': _err,
+    }
+
+
+class Link(object):
+    """
+    Latency and bandwidth model of the bus, every transaction costs latency
+    seconds plus its size over bandwidth bytes per second
+    """
+    def __init__(self, latency=0.0, bandwidth=float('inf')):
+        self.latency = float(latency)
+        self.bandwidth = float(bandwidth)
+
+    def transfer(self, size):
+        delay = self.latency + size / self.bandwidth
+        if delay > 0:
+            sleep(delay)
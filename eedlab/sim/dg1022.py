@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+"""
+Simulated Rigol DG1022 function generator
+
+Each channel keeps the CHANNEL_SETTINGS a DG1022Channel reads and writes,
+addressed with an optional :CH2 suffix and answered with a CH2: prefix like
+the real thing. DATA:DAC accepts binary blocks into volatile memory.
+"""
+import numpy as np
+
+from .core import SimInstrument, normalise
+
+
+class DG1022(SimInstrument):
+    IDN = 'RIGOL TECHNOLOGIES,DG1022 ,DG1D000000000,,00.03.00.09.00.02.11'
+
+    CHANNEL_SETTINGS = {
+        'FUNCTION': 'SIN',
+        'FREQUENCY': 1e3,
+        'VOLTAGE': 5.0,
+        'VOLTAGE:OFFSET': 0.0,
+        'FUNCTION:SQUARE:DCYCLE': 50.0,
+        'FUNCTION:RAMP:SYMM': 50.0,
+        'FUNCTION:USER': 'EXP_RISE',
+        'PHASE': 0.0,
+        'OUTPUT:LOAD': 'INFINITY',
+        'OUTPUT': 'OFF',
+    }
+    SETTINGS = {
+        'VOLTAGE:UNIT': 'VPP',
+        'TRIGGER:SOURCE': 'IMM',
+        'BURST:MODE': 'TRIG',
+        'BURST:NCYCLES': 1,
+        'BURST:INTERNAL:PERIOD': 0.01,
+        'BURST:PHASE': 0.0,
+        'BURST:STATE': 'OFF',
+    }
+
+    def __init__(self):
+        SimInstrument.__init__(self)
+        defaults = dict((normalise(k)[0], str(v)) for k, v in self.CHANNEL_SETTINGS.items())
+        self.channels = {1: dict(defaults), 2: dict(defaults)}
+        self.volatile = None  # DAC codes of the last DATA:DAC upload
+
+    def _limits(self, ch):
+        """ (high, low) of ch from its amplitude and offset """
+        state = self.channels[ch]
+        amp, offset = float(state['VOLT']), float(state['VOLT:OFFS'])
+        return offset + amp / 2, offset - amp / 2
+
+    def _set_limits(self, ch, high, low):
+        self.channels[ch]['VOLT'] = str(high - low)
+        self.channels[ch]['VOLT:OFFS'] = str((high + low) / 2)
+
+    def fallback(self, key):
+        handler = SimInstrument.fallback(self, key)
+        if handler is not None:
+            return handler
+        query = key.endswith('?')
+        keywords = key.rstrip('?').split(':')
+        if keywords[-1] == 'CH#':
+            keywords = keywords[:-1]
+        base = ':'.join(keywords)
+        if keywords[0] == 'APPL':
+            func = keywords[1] if len(keywords) > 1 else None
+            return lambda self, nums, args: self._apply(nums[0] if nums else 1, func, args)
+        if base in ('VOLT:HIGH', 'VOLT:LOW'):
+            index = 0 if base == 'VOLT:HIGH' else 1
+            if query:
+                return lambda self, nums, args: self._reply(nums, self._limits(nums[0] if nums else 1)[index])
+            return lambda self, nums, args: self._set_limit(nums[0] if nums else 1, index, float(args[0]))
+        if base not in self.channels[1]:
+            return None
+        if query:
+            return lambda self, nums, args: self._reply(nums, self.channels[nums[0] if nums else 1][base])
+        return lambda self, nums, args: self._store(nums[0] if nums else 1, base, args[0].upper())
+
+    def _reply(self, nums, value):
+        """ channel 2 replies are prefixed with CH2: """
+        return 'CH{}:{}'.format(nums[0], value) if nums else str(value)
+
+    def _store(self, ch, key, value):
+        self.channels[ch][key] = value
+
+    def _set_limit(self, ch, index, value):
+        limits = list(self._limits(ch))
+        limits[index] = value
+        self._set_limits(ch, *limits)
+
+    def _apply(self, ch, func, args):
+        state = self.channels[ch]
+        if func:
+            state['FUNC'] = func
+        for key, value in zip(('FREQ', 'VOLT', 'VOLT:OFFS'), args):
+            if value:
+                state[key] = str(float(value))
+
+    def _dac(self, nums, args):
+        _, data = args.split(b',', 1)
+        data = data.strip()
+        n = int(data[1:2])
+        length = int(data[2:2 + n])
+        codes = np.frombuffer(data[2 + n:2 + n + length], dtype='<u2')
+        if not 1 < codes.size <= 4096 or codes.max() > 16383:
+            raise ValueError('bad DAC data')
+        self.volatile = codes
+
+    def _nop(self, nums, args):
+        pass
+
+    COMMANDS = {
+        'DATA:DAC': _dac,
+        'PHASE:ALIGN': _nop,
+    }
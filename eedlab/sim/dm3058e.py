@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+"""
+Simulated Rigol DM3058E multimeter
+
+Readings are the value of the selected function in READINGS plus noise,
+:INITiate fills the sample buffer with :SAMPle:COUNt readings that take as
+long as the selected rate would, for :FETCh? to read back.
+"""
+from time import sleep, time
+
+import numpy as np
+
+from .core import SimInstrument
+
+
+def _select(func):
+    """ handler selecting func, optionally setting its range """
+    def handler(self, nums, args):
+        self.function = func
+        if args and args[0]:
+            self.ranges[func] = args[0].upper()
+    return handler
+
+
+def _measure(func):
+    """ handler selecting func and taking a reading """
+    def handler(self, nums, args):
+        self.function = func
+        return '{:e}'.format(self.reading())
+    return handler
+
+
+def _rate(func):
+    """ handler setting the reading rate of func """
+    def handler(self, nums, args):
+        self.rates[func] = args[0].upper()[0]
+    return handler
+
+
+class DM3058E(SimInstrument):
+    IDN = 'Rigol Technologies,DM3058E,DM3L000000000,01.01.00.02.02.00'
+
+    # (:FUNCtion? name, value) of each function
+    READINGS = {
+        'VDC': ('DCV', 1.2345),
+        'VAC': ('ACV', 0.7071),
+        'IDC': ('DCI', 0.0123),
+        'IAC': ('ACI', 0.0071),
+        'RESISTANCE': ('2WR', 1000.0),
+        'FRESISTANCE': ('4WR', 1000.0),
+        'FREQUENCY': ('FREQ', 1000.0),
+        'PERIOD': ('PERI', 0.001),
+        'CONTINUITY': ('CONT', 0.5),
+        'DIODE': ('DIODE', 0.62),
+        'CAPACITANCE': ('CAP', 1e-6),
+    }
+    NOISE = 1e-4
+    # readings per second of the S(low), M(edium) and F(ast) rates
+    RATES = {'S': 2.5, 'M': 20.0, 'F': 123.0}
+
+    def __init__(self):
+        SimInstrument.__init__(self)
+        self.function = 'VDC'
+        self.ranges = {}
+        self.rates = {}
+        self.count = 1
+        self._samples = None  # (time ready, readings) of the last :INITiate
+
+    def reading(self, n=None):
+        value = self.READINGS[self.function][1]
+        noise = np.random.normal(0, self.NOISE * abs(value), n)
+        return value + noise
+
+    def _read(self, nums, args):
+        return '{:e}'.format(self.reading())
+
+    def _function(self, nums, args):
+        return self.READINGS[self.function][0]
+
+    def _sample_count(self, nums, args):
+        self.count = int(args[0])
+
+    def _initiate(self, nums, args):
+        rate = self.RATES[self.rates.get(self.function, 'S')]
+        self._samples = (time() + self.count / rate, self.reading(self.count))
+
+    def _fetch(self, nums, args):
+        if self._samples is None:
+            return self._read(nums, args)
+        ready, readings = self._samples
+        # only the readings taken so far
+        done = readings.size - int(max(ready - time(), 0) * self.RATES[self.rates.get(self.function, 'S')])
+        return ','.join('{:e}'.format(r) for r in readings[:max(done, 1)])
+
+    def _opc_query(self, nums, args):
+        # blocks until the sample buffer is full like the real meter
+        if self._samples is not None:
+            delay = self._samples[0] - time()
+            if delay > 0:
+                sleep(delay)
+        return '1'
+
+    def _esr(self, nums, args):
+        if self._samples is not None and time() < self._samples[0]:
+            return '0'
+        return SimInstrument._esr(self, nums, args)
+
+    def _nop(self, nums, args):
+        pass
+
+    SETTINGS = {
+        ':TRIGGER:SOURCE': 'IMM',
+    }
+
+    COMMANDS = {
+        ':READ?': _read,
+        ':FETCH?': _fetch,
+        ':FUNCTION?': _function,
+        ':INITIATE': _initiate,
+        ':SAMPLE:COUNT': _sample_count,
+        ':MEASURE': _nop,
+        '*OPC?': _opc_query,
+        '*ESR?': _esr,
+    }
+    for func, header in (('VDC', 'voltage:DC'), ('VAC', 'voltage:AC'), ('IDC', 'current:DC'),
+                         ('IAC', 'current:AC'), ('RESISTANCE', 'resistance'), ('FRESISTANCE', 'fresistance'),
+                         ('FREQUENCY', 'frequency'), ('PERIOD', 'period'), ('CONTINUITY', 'continuity'),
+                         ('DIODE', 'diode'), ('CAPACITANCE', 'capacitance')):
+        COMMANDS[':function:' + header] = _select(func)
+        COMMANDS[':measure:' + header] = _select(func)
+        COMMANDS[':measure:' + header + '?'] = _measure(func)
+        COMMANDS[':rate:' + header] = _rate(func)
+    del func, header
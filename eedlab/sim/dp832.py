@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+"""
+Simulated Rigol DP832 power supply
+
+Every output drives a resistive load (LOADS) so the measured voltage and
+current follow the set points with CV/CC crossover, and the :TIMer
+sequencer plays back uploaded groups against the wall clock.
+"""
+from time import time
+
+from .core import SimInstrument
+
+
+def _setter(attr, limit):
+    """ handler setting getattr(sim, attr)[ch] within the LIMITS of ch """
+    def handler(self, nums, args):
+        ch = nums[0] - 1
+        value = float(args[0])
+        if not 0 <= value <= self.LIMITS[ch][limit]:
+            raise ValueError(value)
+        getattr(self, attr)[ch] = value
+    return handler
+
+
+def _getter(limit):
+    """ handler reading the voltage (0) or current (1) set point, or its MIN/MAX """
+    def handler(self, nums, args):
+        ch = nums[0] - 1
+        if args and args[0].upper().startswith('MIN'):
+            value = 0.0
+        elif args and args[0].upper().startswith('MAX'):
+            value = self.LIMITS[ch][limit]
+        else:
+            value = self.setpoint(ch)[limit]
+        return '{:.3f}'.format(value)
+    return handler
+
+
+def _measurer(index):
+    """ handler reading one of the (v, i, p) of DP832.measure """
+    def handler(self, nums, args):
+        return '{:.4f}'.format(self.measure(self._ch(args[0]))[index])
+    return handler
+
+
+def _timer_setting(header):
+    """ handler storing the <ch>,<value> of a :TIMer setting per channel """
+    def handler(self, nums, args):
+        self.set_value(header, ','.join(args[1:]), self._ch(args[0]) + 1)
+    return handler
+
+
+class DP832(SimInstrument):
+    IDN = 'RIGOL TECHNOLOGIES,DP832,DP3A000000000,00.01.14'
+
+    # (vmax, imax) of CH1 to CH3
+    LIMITS = ((32.0, 3.2), (32.0, 3.2), (5.3, 3.2))
+    # load resistance on each output, ohms
+    LOADS = [10.0, 10.0, 10.0]
+
+    def __init__(self):
+        SimInstrument.__init__(self)
+        self.vset = [0.0, 0.0, 0.0]
+        self.iset = [1.0, 1.0, 1.0]
+        self.output = [False, False, False]
+        self.loads = list(self.LOADS)
+        self.timers = [None, None, None]  # (start time, [(v, i, dwell)], cycles) while running
+        self._groups = [[], [], []]
+
+    @staticmethod
+    def _ch(name):
+        """ 0 based index of a CH1 style channel name """
+        return int(name.upper().replace('CH', '')) - 1
+
+    def setpoint(self, ch):
+        """ (v, i) set point of ch, following the timer when it is running """
+        timer = self.timers[ch]
+        if timer is None:
+            return self.vset[ch], self.iset[ch]
+        start, groups, cycles = timer
+        period = sum(d for _, _, d in groups)
+        elapsed = time() - start
+        if period <= 0 or elapsed >= period * cycles:
+            # LAST end state holds the final group
+            self.vset[ch], self.iset[ch] = groups[-1][:2]
+            self.timers[ch] = None
+            return self.vset[ch], self.iset[ch]
+        elapsed %= period
+        for v, i, dwell in groups:
+            if elapsed < dwell:
+                return v, i
+            elapsed -= dwell
+        return groups[-1][:2]
+
+    def measure(self, ch):
+        """ (v, i, p, mode) at the output of ch """
+        if not self.output[ch]:
+            return 0.0, 0.0, 0.0, 'CV'
+        v, i = self.setpoint(ch)
+        load = self.loads[ch]
+        if v / load > i:
+            v, mode = i * load, 'CC'
+        else:
+            i, mode = v / load, 'CV'
+        return v, i, v * i, mode
+
+    def _measure_all(self, nums, args):
+        return ','.join('{:.4f}'.format(x) for x in self.measure(self._ch(args[0]))[:3])
+
+    def _output_state(self, nums, args):
+        self.output[self._ch(args[0])] = args[1].upper() in ('ON', '1')
+
+    def _output_state_query(self, nums, args):
+        return 'ON' if self.output[self._ch(args[0])] else 'OFF'
+
+    def _output_mode(self, nums, args):
+        return self.measure(self._ch(args[0]))[3]
+
+    def _timer_groups(self, nums, args):
+        self._groups[self._ch(args[0])] = [None] * int(args[1])
+
+    def _timer_parameter(self, nums, args):
+        self._groups[self._ch(args[0])][int(args[1])] = tuple(float(a) for a in args[2:5])
+
+    def _timer_state(self, nums, args):
+        ch = self._ch(args[0])
+        if args[1].upper() in ('ON', '1'):
+            groups = [g for g in self._groups[ch] if g is not None]
+            cycles = self.value('TIMER:CYCLES', ch + 1).split(',')
+            cycles = float('inf') if cycles[0].upper() == 'I' else int(cycles[-1])
+            self.timers[ch] = (time(), groups, cycles) if groups else None
+        elif self.timers[ch] is not None:
+            self.vset[ch], self.iset[ch] = self.setpoint(ch)
+            self.timers[ch] = None
+
+    def _nop(self, nums, args):
+        pass
+
+    SETTINGS = {
+        'TIMER:CYCLES': 'N,1',
+        'TIMER:ENDSTATE': 'LAST',
+    }
+
+    COMMANDS = {
+        ':MEASURE': _nop,
+        ':MEASURE:ALL:DC?': _measure_all,
+        ':MEASURE:VOLTAGE:DC?': _measurer(0),
+        ':MEASURE:CURRENT:DC?': _measurer(1),
+        ':MEASURE:POWER:DC?': _measurer(2),
+        ':SOURCE1:VOLTAGE': _setter('vset', 0),
+        ':SOURCE1:VOLTAGE?': _getter(0),
+        ':SOURCE1:CURRENT': _setter('iset', 1),
+        ':SOURCE1:CURRENT?': _getter(1),
+        ':OUTPUT:STATE': _output_state,
+        ':OUTPUT:STATE?': _output_state_query,
+        ':OUTPUT:MODE?': _output_mode,
+        ':TIMER:GROUPS': _timer_groups,
+        ':TIMER:PARAMETER': _timer_parameter,
+        ':TIMER:STATE': _timer_state,
+        ':TIMER:CYCLES': _timer_setting('TIMER:CYCLES'),
+        ':TIMER:ENDSTATE': _timer_setting('TIMER:ENDSTATE'),
+    }
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+"""
+Simulated Rigol DS1054 oscilloscope
+
+Each channel shows a sine (SIGNALS) plus a little noise, :WAV:DATA? answers
+BYTE and WORD reads of the START/STOP window as definite length blocks
+(or the screen as ASCII) scaled with the same preamble a real scope sends.
+"""
+from time import time
+
+import numpy as np
+
+from .core import SimInstrument, block
+
+
+SCREEN_POINTS = 1200
+MAX_READ = {'BYTE': 250000, 'WORD': 125000, 'ASC': 15625}
+FORMATS = {'BYTE': 0, 'WORD': 1, 'ASC': 2}
+MODES = {'NORM': 0, 'MAX': 1, 'RAW': 2}
+
+
+class DS1054(SimInstrument):
+    IDN = 'RIGOL TECHNOLOGIES,DS1104Z,DS1ZA000000000,00.04.04.SP3'
+
+    # (frequency Hz, amplitude V, phase deg) of the signal on each channel
+    SIGNALS = {
+        1: (1e3, 1.5, 0.0),
+        2: (1e3, 1.0, -90.0),
+        3: (10e3, 0.5, 0.0),
+        4: (100e3, 0.2, 0.0),
+    }
+    NOISE = 0.01
+
+    SETTINGS = {
+        'TRIGGER:SWEEP': 'AUTO',
+        'TRIGGER:MODE': 'EDGE',
+        'TRIGGER:EDGE:SLOPE': 'POS',
+        'TRIGGER:EDGE:LEVEL': 0.0,
+        'TRIGGER:EDGE:SOURCE': 'CHAN1',
+        'MEASURE:SOURCE': 'CHAN1',
+        'MEASURE:SETUP:MIN': 10,
+        'MEASURE:SETUP:MID': 50,
+        'MEASURE:SETUP:MAX': 90,
+        'MEASURE:STATISTIC:MODE': 'EXTREMUM',
+        'MEASURE:STATISTIC:ITEM': '',
+        'TIMEBASE:MAIN:SCALE': 1e-3,
+        'TIMEBASE:MAIN:OFFSET': 0.0,
+        'ACQUIRE:AVERAGES': 2,
+        'ACQUIRE:TYPE': 'NORM',
+        'ACQUIRE:MDEPTH': 'AUTO',
+        'CHANNEL1:SCALE': 1.0,
+        'CHANNEL1:OFFSET': 0.0,
+        'CHANNEL1:BWLIMIT': 'OFF',
+        'WAVEFORM:SOURCE': 'CHAN1',
+        'WAVEFORM:MODE': 'NORM',
+        'WAVEFORM:FORMAT': 'BYTE',
+        'WAVEFORM:START': 1,
+        'WAVEFORM:STOP': SCREEN_POINTS,
+    }
+
+    def __init__(self):
+        SimInstrument.__init__(self)
+        self.running = True
+        self._single = None  # time a :SINGLE was armed
+
+    # acquisition
+
+    def _run(self, nums, args):
+        self.running = True
+        self._single = None
+
+    def _stop(self, nums, args):
+        self.running = False
+        self._single = None
+
+    def _arm(self, nums, args):
+        self.running = False
+        self._single = time()
+
+    def _trigger_status(self, nums, args):
+        if self._single is not None:
+            # triggers once a screen's worth of time has been captured
+            if time() - self._single < 12 * float(self.value('TIMEBASE:MAIN:SCALE')):
+                return 'WAIT'
+            self._single = None
+        return 'TD' if self.running else 'STOP'
+
+    def _nop(self, nums, args):
+        pass
+
+    # waveforms
+
+    def mem_depth(self):
+        mdepth = self.value('ACQUIRE:MDEPTH')
+        return 12000 if mdepth.upper() == 'AUTO' else int(float(mdepth))
+
+    def _wav(self):
+        """ (channel, format, mode) of the :WAV settings """
+        src = self.value('WAVEFORM:SOURCE').upper()
+        fmt = self.value('WAVEFORM:FORMAT').upper()[:4].rstrip('I')
+        mode = self.value('WAVEFORM:MODE').upper()[:4].rstrip('A')
+        return int(src[-1]), fmt, mode
+
+    def preamble(self):
+        """ (format, type, points, count, xinc, xorigin, xref, yinc, yorigin, yref) of the :WAV settings """
+        chan, fmt, mode = self._wav()
+        points = SCREEN_POINTS
+        if mode != 'NORM' and not self.running:
+            points = self.mem_depth()
+        scale = float(self.value('TIMEBASE:MAIN:SCALE'))
+        x_inc = 12 * scale / points
+        x_origin = -6 * scale + float(self.value('TIMEBASE:MAIN:OFFSET'))
+        y_inc = float(self.value('CHANNEL{}:SCALE'.format(chan))) / 25
+        y_origin = float(self.value('CHANNEL{}:OFFSET'.format(chan))) / y_inc
+        return FORMATS[fmt], MODES[mode], points, 1, x_inc, x_origin, 0, y_inc, int(round(y_origin)), 127
+
+    def volts(self, chan, start, stop):
+        """ samples start to stop (1 based, inclusive) of chan in volts """
+        pre = self.preamble()
+        t = np.arange(start - 1, stop) * pre[4] + pre[5]
+        freq, amp, phase = self.SIGNALS[chan]
+        v = amp * np.sin(2 * np.pi * freq * t + np.radians(phase))
+        return v + np.random.normal(0, self.NOISE, v.size)
+
+    def _preamble(self, nums, args):
+        return ','.join(str(p) for p in self.preamble())
+
+    def _data(self, nums, args):
+        chan, fmt, mode = self._wav()
+        pre = self.preamble()
+        if fmt == 'ASC' or mode == 'NORM' or self.running:
+            start, stop = 1, pre[2]
+        else:
+            start = max(int(self.value('WAVEFORM:START')), 1)
+            stop = min(int(self.value('WAVEFORM:STOP')), pre[2], start + MAX_READ[fmt] - 1)
+        v = self.volts(chan, start, stop)
+        if fmt == 'ASC':
+            data = ','.join('{:e}'.format(x) for x in v)
+            return '#9{:09d}{}'.format(len(data), data)
+        raw = np.clip(np.rint(v / pre[7] + pre[8] + pre[9]), 0, 255)
+        return block(raw.astype(np.uint8 if fmt == 'BYTE' else '<u2').tobytes())
+
+    # measurements
+
+    def measure(self, item, srcs):
+        item = item.upper()
+        chans = [int(src[-1]) for src in srcs]
+        freq, amp, phase = self.SIGNALS[chans[0]]
+        if item.startswith('FREQ'):
+            return freq
+        if item.startswith('PER'):
+            return 1.0 / freq
+        if item in ('RPH', 'FPH', 'RPHASE', 'FPHASE'):
+            # delay from A to B over the period, positive when B lags A
+            return phase - self.SIGNALS[chans[1]][2]
+        v = self.volts(chans[0], 1, SCREEN_POINTS)
+        funcs = {
+            'VMAX': v.max, 'VMIN': v.min, 'VPP': lambda: np.ptp(v), 'VAVG': v.mean,
+            'VRMS': lambda: np.sqrt(np.mean(v ** 2)), 'VTOP': lambda: amp, 'VBAS': lambda: -amp,
+            'VAMP': lambda: 2 * amp, 'VARI': v.var,
+        }
+        func = funcs.get(item[:4])
+        return 9.9e37 if func is None else func()
+
+    def _measure_item(self, nums, args):
+        srcs = args[1:] or [self.value('MEASURE:SOURCE')]
+        return '{:e}'.format(self.measure(args[0], srcs))
+
+    def _statistic_item(self, nums, args):
+        return '{:e}'.format(self.measure(args[1], args[2:]))
+
+    COMMANDS = {
+        ':RUN': _run,
+        ':STOP': _stop,
+        ':SINGLE': _arm,
+        ':CLEAR': _nop,
+        ':TFORCE': _nop,
+        ':AUTOSCALE': _run,
+        'TRIGGER:STATUS?': _trigger_status,
+        'WAVEFORM:PREAMBLE?': _preamble,
+        'WAVEFORM:DATA?': _data,
+        'MEASURE:ITEM?': _measure_item,
+        'MEASURE:STATISTIC:ITEM?': _statistic_item,
+        'MEASURE:STATISTIC:RESET': _nop,
+    }
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Raw socket SCPI server around a simulated instrument, for exercising the
+raw_socket backend and a real TCP stack without the instrument
+"""
+import socket
+import threading
+
+from .core import Link, split_block
+from ..raw_socket import DEFAULT_PORT
+
+
+class Server(object):
+    """
+    Serve sim (a SimInstrument) on host:port, port 0 picks a free port
+
+    Every connection talks to the same sim, one message at a time, and the
+    link model is applied on top of the real socket.
+    """
+    def __init__(self, sim, host='127.0.0.1', port=DEFAULT_PORT, latency=0.0, bandwidth=float('inf')):
+        self.sim = sim
+        self.link = Link(latency, bandwidth)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(4)
+        self.host, self.port = self.sock.getsockname()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def dev(self):
+        """ dev string of this server for the raw_socket backend """
+        return '{}:{}'.format(self.host, self.port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except (socket.error, OSError):
+                return  # closed
+            thread = threading.Thread(target=self._handle, args=(conn,))
+            thread.daemon = True
+            thread.start()
+
+    def close(self):
+        self.sock.close()
+
+    def _handle(self, conn):
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        buf = b''
+        try:
+            while True:
+                data = conn.recv(65536)
+                if not data:
+                    break
+                buf += data
+                while True:
+                    split = split_block(buf)
+                    if split is None:
+                        break
+                    message, buf = split
+                    with self._lock:
+                        self.link.transfer(len(message) + 1)
+                        reply = self.sim.handle(message)
+                        if reply is not None:
+                            self.link.transfer(len(reply))
+                    if reply is not None:
+                        conn.sendall(reply)
+        except (socket.error, OSError):
+            pass
+        finally:
+            conn.close()
+
+
+def serve(model, host='127.0.0.1', port=DEFAULT_PORT, latency=0.0, bandwidth=float('inf')):
+    """ start serving a new simulated model (eg 'DS1054') in the background, returns the Server """
+    from . import MODELS
+    return Server(MODELS[model.upper()](), host, port, latency, bandwidth).start()
@@ -7,8 +7,9 @@ setup(name='eedlab',
       author='Oliver Thane',
       author_email='othane@gmail.com',
       license='MIT',
-      packages=['eedlab'],
+      packages=['eedlab', 'eedlab.sim'],
       install_requires=[
+          'numpy>=1.13',
           'python-vxi11>=0.9',
           'python-usbtmc==0.8',
           'pyusb==1.0.2',
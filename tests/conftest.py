@@ -0,0 +1,75 @@
+import pytest
+
+from eedlab import scpi
+
+
+@pytest.fixture(autouse=True)
+def backend_cache(tmp_path, monkeypatch):
+    """ keep connect() from reading or writing the user's backend cache """
+    monkeypatch.setattr(scpi, 'CACHE_PATH', str(tmp_path / 'backends.json'))
+
+
+@pytest.fixture
+def scope():
+    from eedlab.ds1054 import DS1054
+    return DS1054('SIM::DS1054', backends=['sim'])
+
+
+@pytest.fixture
+def psu():
+    from eedlab.dp832 import DP832
+    return DP832('SIM::DP832', backends=['sim'])
+
+
+@pytest.fixture
+def gen():
+    from eedlab.dg1022 import DG1022
+    return DG1022('SIM::DG1022', backends=['sim'])
+
+
+@pytest.fixture
+def dmm():
+    from eedlab.dm3058e import DM3058E
+    return DM3058E('SIM::DM3058E', backends=['sim'])
+
+
+class Bus(object):
+    """ wraps the backend of a driver's Session to log what goes out on the bus """
+    def __init__(self, instr):
+        self.instr = instr
+        self.queries = []
+        self.writes = []
+
+    def query(self, message, *args, **kwargs):
+        self.queries.append(message)
+        return self.instr.query(message, *args, **kwargs)
+
+    def query_raw(self, message, *args, **kwargs):
+        self.queries.append(message)
+        return self.instr.query_raw(message, *args, **kwargs)
+
+    def write(self, message, *args, **kwargs):
+        self.writes.append(message)
+        return self.instr.write(message, *args, **kwargs)
+
+    def write_raw(self, data, *args, **kwargs):
+        self.writes.append(data)
+        return self.instr.write_raw(data, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.instr, name)
+
+    def __setattr__(self, name, value):
+        if name in ('instr', 'queries', 'writes'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.instr, name, value)
+
+
+@pytest.fixture
+def bus():
+    """ bus(driver) starts logging the messages driver sends, returns the Bus """
+    def watch(driver):
+        driver.instr.instr = Bus(driver.instr.instr)
+        return driver.instr.instr
+    return watch
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from eedlab.bode import bode_sweep
+
+
+def test_sweep(scope, gen, bus):
+    log = bus(scope)
+    result = bode_sweep(gen.channels[0], scope, [1e3, 2e3], settle=0)
+    assert list(result['frequency']) == [1e3, 2e3]
+    # CH2 is 1 V lagging the 1.5 V of CH1 by 90 degrees
+    assert list(result['phase']) == [-90, -90]
+    assert result['gain_db'] == pytest.approx(20 * np.log10(1 / 1.5), abs=0.2)
+    assert sum(q.startswith(':measure:item?') for q in log.queries) == 2
+    assert gen.channels[0].frequency == 2e3
+
+
+def test_sweep_to_file(scope, gen, tmp_path):
+    path = str(tmp_path / 'bode.npy')
+    bode_sweep(gen.channels[0], scope, [1e3, 2e3, 5e3], settle=0, path=path)
+    assert list(np.load(path)['frequency']) == [1e3, 2e3, 5e3]
+
+
+def test_failed_generator_step_is_raised(scope, tmp_path):
+    class Generator(object):
+        steps = []
+
+        @property
+        def frequency(self):
+            return self.steps[-1]
+
+        @frequency.setter
+        def frequency(self, f):
+            if len(self.steps) == 2:
+                raise IOError('generator gone')
+            self.steps.append(f)
+
+    path = str(tmp_path / 'bode.npy')
+    with pytest.raises(IOError):
+        bode_sweep(Generator(), scope, [1e3, 2e3, 3e3, 4e3], settle=0, path=path)
+    # the rows measured before the failure are kept
+    assert list(np.load(path)['frequency'][:2]) == [1e3, 2e3]
+    assert np.isnan(np.load(path)['frequency'][2])
@@ -0,0 +1,118 @@
+import threading
+import types
+from time import time
+
+import pytest
+
+from eedlab import scpi
+
+
+@pytest.fixture
+def backends(monkeypatch):
+    """ fake backends {name: (delay, ok)}, returns the log of concurrent probes and their timeouts """
+    config = {}
+    active = []
+    log = []
+    timeouts = {}
+    lock = threading.Lock()
+
+    def import_backend(name):
+        delay, ok = config[name]
+
+        class Instrument(object):
+            timeout = 5.0
+
+            def __init__(self, dev):
+                pass
+
+            def query(self, message):
+                with lock:
+                    active.append(name)
+                    log.append((name, tuple(active)))
+                timeouts[name] = self.timeout
+                threading.Event().wait(min(delay, self.timeout))
+                with lock:
+                    active.remove(name)
+                if not ok or delay > self.timeout:
+                    raise IOError('no answer')
+                return name
+
+            def close(self):
+                pass
+
+        return types.SimpleNamespace(Instrument=Instrument)
+
+    monkeypatch.setattr(scpi, 'import_backend', import_backend)
+    return config, log, timeouts
+
+
+def test_usb_backends_probed_in_turn(backends):
+    config, log, _ = backends
+    config.update(linux_kernel=(0.1, False), python_usbtmc=(0.05, True), raw_socket=(0.2, True))
+    _, _, name, _ = scpi.connect('dev', ['linux_kernel', 'python_usbtmc', 'raw_socket'], cache=False)
+    assert name == 'python_usbtmc'
+    for probe, active in log:
+        assert not {'linux_kernel', 'python_usbtmc'} <= set(active)
+
+
+def test_later_usb_backend_skipped_once_one_answers(backends):
+    config, log, _ = backends
+    config.update(linux_kernel=(0.0, True), python_usbtmc=(0.0, True))
+    _, _, name, _ = scpi.connect('dev', ['linux_kernel', 'python_usbtmc'], cache=False)
+    assert name == 'linux_kernel'
+    assert [probe for probe, _ in log] == ['linux_kernel']
+
+
+def test_earliest_backend_wins(backends):
+    config, _, _ = backends
+    config.update(python_vxi11=(0.1, True), raw_socket=(0.0, True))
+    _, _, name, _ = scpi.connect('dev', ['python_vxi11', 'raw_socket'], cache=False)
+    assert name == 'python_vxi11'
+
+
+def test_probes_time_out_quickly(backends):
+    config, _, timeouts = backends
+    # the preferred backend is absent, it would take its whole 5 s I/O timeout
+    config.update(python_vxi11=(10.0, True), raw_socket=(0.0, True))
+    t0 = time()
+    instr, _, name, _ = scpi.connect('dev', ['python_vxi11', 'raw_socket'], cache=False)
+    assert time() - t0 < 2 * scpi.PROBE_TIMEOUT
+    assert name == 'raw_socket'
+    assert timeouts == {'python_vxi11': scpi.PROBE_TIMEOUT, 'raw_socket': scpi.PROBE_TIMEOUT}
+    assert instr.timeout == 5.0  # restored once connected
+
+
+def test_probe_timeout_none_keeps_backend_timeout(backends):
+    config, _, timeouts = backends
+    config.update(raw_socket=(1.5, True))
+    instr, _, name, _ = scpi.connect('dev', ['raw_socket'], timeout=None, cache=False)
+    assert name == 'raw_socket'
+    assert timeouts['raw_socket'] == instr.timeout == 5.0
+
+
+def test_cached_backend_tried_first(backends):
+    config, log, _ = backends
+    config.update(python_vxi11=(0.0, True), raw_socket=(0.0, True))
+    assert scpi.connect('dev', ['python_vxi11', 'raw_socket'])[2] == 'python_vxi11'
+    config.update(python_vxi11=(0.0, False))
+    assert scpi.connect('dev', ['raw_socket', 'python_vxi11'])[2] == 'raw_socket'
+    del log[:]
+    assert scpi.connect('dev', ['python_vxi11', 'raw_socket'])[2] == 'raw_socket'
+    assert [probe for probe, _ in log] == ['raw_socket']
+
+
+def test_no_backend_answers(backends):
+    pytest.importorskip('universal_usbtmc')
+    config, _, _ = backends
+    config.update(python_vxi11=(0.0, False))
+    with pytest.raises(IOError):
+        scpi.connect('dev', 'python_vxi11')
+
+
+def test_driver_keeps_the_backends_it_tried(monkeypatch):
+    from eedlab.dm3058e import DM3058E
+    monkeypatch.setattr(scpi, 'platform', 'linux')
+    assert scpi.resolve_backends(None, ['python_usbtmc']) == ['linux_kernel', 'python_usbtmc']
+    assert scpi.resolve_backends('sim') == ['sim']
+    dmm = DM3058E('SIM::DM3058E', 'sim', timeout=0.5)
+    assert dmm.__backends__ == ['sim']
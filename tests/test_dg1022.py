@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+
+def test_load_arb(gen, bus):
+    sim = gen.instr.instr.sim
+    log = bus(gen)
+    gen.channels[1].load_arb(np.sin(np.linspace(0, 2 * np.pi, 100)))
+    assert len(sim.volatile) == 100
+    assert sim.volatile.min() < 10 and sim.volatile.max() > 16373
+    assert sim.volatile[0] == 8192
+    assert sim.channels[2]['FUNC'] == 'USER'
+    uploads = [w for w in log.writes if isinstance(w, bytes)]
+    assert len(uploads) == 1 and uploads[0].startswith(b'DATA:DAC VOLATILE,#3200')
+
+
+def test_load_arb_skips_the_same_waveform(gen, bus):
+    log = bus(gen)
+    samples = np.linspace(-1, 1, 4096)
+    gen.channels[0].load_arb(samples)
+    gen.channels[1].load_arb(samples)
+    gen.channels[0].load_arb(samples, force=True)
+    gen.channels[0].load_arb(samples[::-1])
+    assert len([w for w in log.writes if isinstance(w, bytes)]) == 3
+
+
+def test_load_arb_normalise(gen):
+    gen.channels[0].load_arb([0, 5, 10], normalise=True)
+    assert list(gen.instr.instr.sim.volatile) == [0, 8192, 16383]
+    with pytest.raises(ValueError):
+        gen.channels[0].load_arb([0])
+
+
+def test_apply_state(gen, bus):
+    ch = gen.channels[1]
+    state = ch.snapshot_state()
+    assert state['function'] == 'SIN' and state['frequency'] == 1e3 and not state['output']
+    log = bus(gen)
+    assert ch.apply_state({'frequency': 2e3, 'amplitude': 2.0, 'output': True, 'phase': 0.0}) == 2
+    assert log.writes == ['APPLY:SIN:CH2 2000.0,2.0,0.0', 'OUTPUT:CH2 ON']
+    assert ch.apply_state({'frequency': 2e3, 'output': 'ON'}) == 0
+    assert ch.apply_state({'vdc': 0.5}) == 1
+    assert not log.queries
+    sim = gen.instr.instr.sim.channels[2]
+    assert (float(sim['FREQ']), float(sim['VOLT']), float(sim['VOLT:OFFS']), sim['OUTP']) == (2e3, 2.0, 0.5, 'ON')
+    assert ch.snapshot_state() == dict(state, frequency=2e3, amplitude=2.0, vdc=0.5, output=True)
+
+
+def test_apply_state_of_every_channel(gen):
+    assert gen.apply_state({1: {'frequency': 5e3}, 2: {'function': 'SQU', 'duty': 20}}) == 3
+    assert gen.channels[0].frequency == 5e3
+    assert gen.channels[1].function == 'SQU' and gen.channels[1].duty == 20
+    # a setter keeps the cached snapshot in step
+    gen.channels[0].frequency = 1e3
+    assert gen.apply_state({1: {'frequency': 1e3}}) == 0
@@ -0,0 +1,81 @@
+from time import sleep, time
+
+import numpy as np
+import pytest
+
+
+def test_sample(dmm, bus):
+    log = bus(dmm)
+    t, readings = dmm.sample('vdc', 20)
+    assert len(t) == len(readings) == 20
+    assert readings == pytest.approx(1.2345, rel=1e-3)
+    assert t[0] == 0 and t[-1] > 0.1  # 20 readings at 123/s
+    assert ':rate:voltage:DC FAST' in log.writes
+    assert log.writes[-2:] == [':sample:count 1', ':measure AUTO']
+    del log.writes[:]
+    dmm.sample('VDC', 5)
+    assert not [w for w in log.writes if w.startswith((':rate', 'function'))]
+
+
+def test_sample_other_function(dmm):
+    _, readings = dmm.sample('RESISTANCE', 5, rate='MEDIUM')
+    assert readings == pytest.approx(1000, rel=1e-3)
+    assert dmm.ask(':function?') == '2WR'
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time() + timeout
+    while not condition():
+        assert time() < deadline, 'timed out'
+        sleep(0.01)
+
+
+def test_stream(dmm):
+    blocks = []
+    with dmm.stream(size=50) as stream:
+        stream.subscribe(lambda t, readings: blocks.append(readings))
+        wait_for(lambda: stream.ring.count > 60)
+    rows, stats = stream.snapshot()
+    assert rows.shape == (50, 2)
+    assert (np.diff(rows[:, 0]) >= 0).all()
+    assert rows[:, 1] == pytest.approx(1.2345, rel=1e-3)
+    assert stats['n'] == stream.ring.count > 60
+    assert stats['mean'] == pytest.approx(1.2345, rel=1e-4)
+    assert 0 < len(blocks) <= stats['n']
+    assert not stream.running and stream.error is None
+
+
+def test_stream_blocks(dmm):
+    with dmm.stream('IDC', block=10) as stream:
+        wait_for(lambda: stream.ring.count >= 20)
+    rows, stats = stream.snapshot()
+    assert stream.ring.count % 10 == 0
+    assert rows[:, 1] == pytest.approx(0.0123, rel=1e-3)
+
+
+def test_meter_shared_while_streaming(dmm):
+    with dmm.stream() as stream:
+        wait_for(lambda: stream.ring.count > 5)
+        resistances = np.array([dmm.resistance for _ in range(20)])
+        _, readings = dmm.sample('FREQUENCY', 5)
+        count = stream.ring.count
+        wait_for(lambda: stream.ring.count > count + 5)
+    rows, _ = stream.snapshot()
+    assert rows[:, 1] == pytest.approx(1.2345, rel=1e-3)
+    assert resistances == pytest.approx(1000, rel=1e-3)
+    assert readings == pytest.approx(1000, rel=1e-3)
+
+
+def test_read_fast_path(dmm, bus):
+    log = bus(dmm)
+    assert dmm.vdc == pytest.approx(1.2345, rel=1e-3)
+    assert dmm.vdc == pytest.approx(1.2345, rel=1e-3)
+    assert dmm.iac == pytest.approx(0.0071, rel=1e-3)
+    dmm.function = 'VAC'
+    assert dmm.vac == pytest.approx(0.7071, rel=1e-3)
+    dmm.vdc = 20.0  # range, selects VDC too
+    dmm.vdc
+    dmm.invalidate()
+    dmm.vdc
+    assert log.queries == [':measure:voltage:DC?', ':read?', ':measure:current:AC?', ':read?',
+                           ':read?', ':measure:voltage:DC?']
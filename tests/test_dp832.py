@@ -0,0 +1,126 @@
+from time import sleep
+
+import numpy as np
+import pytest
+
+
+def test_snapshot_follows_load(psu, bus):
+    ch = psu.channels[0]
+    ch.vdc = 5
+    ch.idc = 0.3
+    ch.on()
+    psu.limits
+    log = bus(psu)
+    snap = psu.snapshot()
+    assert len(log.queries) == 1
+    # the 10 ohm load limits 5 V to 0.3 A
+    assert snap.current[0] == pytest.approx(0.3)
+    assert snap.voltage[0] == pytest.approx(3.0)
+    assert snap.power[0] == pytest.approx(0.9)
+    assert snap.vset[0] == 5 and snap.iset[0] == 0.3 and snap.state[0]
+    assert not snap.state[1]
+    assert snap.vmax[2] == 5.3 and snap.imax[2] == 3.2
+
+
+def test_limits_read_once(psu, bus):
+    log = bus(psu)
+    assert psu.limits == [(0.0, 32.0, 0.0, 3.2), (0.0, 32.0, 0.0, 3.2), (0.0, 5.3, 0.0, 3.2)]
+    sent = len(log.queries)
+    assert sent <= 2  # 12 queries over INPUT_BUFFER
+    psu.limits
+    assert len(log.queries) == sent
+
+
+def test_telemetry(psu):
+    ch = psu.channels[1]
+    ch.vdc = 2
+    ch.on()
+    with psu.telemetry(rate=100.0, size=20) as telemetry:
+        while telemetry.ring.count < 10:
+            sleep(0.01)
+        ch.vdc = 4  # from this thread while it polls
+        count = telemetry.ring.count
+        while telemetry.ring.count < count + 12:
+            sleep(0.01)
+    assert telemetry.error is None
+    t = telemetry.column('t')
+    assert len(t) == 20 and (np.diff(t) > 0).all()
+    assert telemetry.column('v2')[-1] == pytest.approx(4.0)
+    assert telemetry.column('i2')[-1] == pytest.approx(0.4)
+    assert 2.0 in telemetry.column('v2')
+    assert not telemetry.column('v1').any()
+    stats = telemetry.stats
+    assert stats['samples'] == telemetry.ring.count
+    assert 0 <= stats['jitter_mean'] < 0.01
+
+
+def test_deferred_skips_readback(psu, bus):
+    log = bus(psu)
+    with psu.deferred():
+        assert log.queries == [':SYSTem:ERRor?']  # clearing out older errors
+        psu.channels[0].vdc = 3
+        psu.channels[0].idc = 0.5
+        psu.channels[0].on()
+        assert len(log.queries) == 1
+    assert log.queries == [':SYSTem:ERRor?'] * 2
+    assert psu.readback
+    assert psu.snapshot().vset[0] == 3
+
+
+def test_deferred_raises_the_block_errors(psu):
+    from eedlab.scpi import ScpiError
+    with pytest.raises(ScpiError) as e:
+        with psu.deferred():
+            psu.channels[0].vdc = 3
+            psu.channels[2].vdc = 30  # beyond the 5.3 V of CH3
+    assert [code for code, _ in e.value.errors] == [-222]
+    psu.sync()
+
+
+def test_deferred_ignores_earlier_errors(psu):
+    psu.channels[2].vdc = 30
+    with psu.deferred():
+        psu.channels[0].vdc = 3
+
+
+def test_deferred_drops_errors_of_a_failed_block(psu):
+    with pytest.raises(KeyError):
+        with psu.deferred():
+            psu.channels[2].vdc = 30
+            raise KeyError('oops')
+    assert psu.readback
+    psu.sync()
+
+
+def test_timer_profile(psu):
+    setpoints = {(0, 'vdc'): [1, 2], (0, 'idc'): [1, 0.5]}
+    profile = psu.profile([0, 1.5], setpoints, hold=2.0)
+    assert profile.mode == 'timer'
+    assert profile.timing is None
+    sim = psu.instr.instr.sim
+    assert sim.timers[0][1] == [(1, 1, 1.5), (2, 0.5, 2.0)]
+    assert sim.setpoint(0) == (1, 1)
+    profile.stop()
+    assert sim.timers[0] is None
+
+
+def test_streamed_profile(psu):
+    setpoints = {(0, 'vdc'): [1, 2, 3], (1, 'vdc'): [3, 2, 1]}
+    profile = psu.profile([0, 0.05, 0.1], setpoints)
+    assert profile.mode == 'stream'
+    profile.join(5)
+    assert profile.error is None
+    timing = profile.timing
+    assert timing['steps'] == 3 and 0 <= timing['late_max'] < 0.05
+    assert list(psu.snapshot().vset[:2]) == [3, 1]
+
+
+def test_timer_profile_must_start_at_zero(psu):
+    setpoints = {(0, 'vdc'): [1, 2], (0, 'idc'): [1, 1]}
+    with pytest.raises(ValueError):
+        psu.profile([1, 2], setpoints, use_timer=True)
+    profile = psu.profile([0.05, 0.1], setpoints)  # streamed instead
+    assert profile.mode == 'stream'
+    profile.join(5)
+    assert profile.timing['steps'] == 2
+    assert psu.channels[0].vdc['set'] == 2
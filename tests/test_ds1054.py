@@ -0,0 +1,172 @@
+from time import time
+
+import numpy as np
+import pytest
+
+
+def test_screen_trace(scope):
+    trace, ts = scope.get_trace(1)
+    assert 1000 < len(trace) <= 1200
+    assert ts == scope.preamble().x_increment
+    assert np.abs(trace).max() < 2
+
+
+def test_deep_memory_trace(scope):
+    scope.mem_depth = 120000
+    trace, ts = scope.get_trace(1, batch=True)
+    assert len(trace) == 120000
+    assert trace.max() > 1.4 and trace.min() < -1.4
+    trace, _ = scope.get_trace(2, batch=True, fmt='WORD', dtype=np.float32)
+    assert len(trace) == 120000 and trace.dtype == np.float32
+    assert trace.max() > 0.9 and trace.min() < -0.9
+
+
+def test_trace_as_list(scope):
+    trace, _ = scope.get_trace(1, batch=True, as_list=True)
+    assert isinstance(trace, list) and len(trace) == 12000
+    assert isinstance(trace[0], float)
+
+
+def test_iter_trace_chunks(scope):
+    scope.mem_depth = 120000
+    chunks = list(scope.iter_trace(1, chunk_points=50000))
+    assert [offset for offset, _ in chunks] == [0, 50000, 100000]
+    assert [chunk.size for _, chunk in chunks] == [50000, 50000, 20000]
+    assert scope.instr.instr.sim.running
+
+
+def test_iter_trace_into_out(scope):
+    out = np.zeros(12000)
+    for offset, chunk in scope.iter_trace(1, chunk_points=5000, out=out):
+        assert np.shares_memory(chunk, out)
+    assert out.max() > 1.4 and out.min() < -1.4
+
+
+def test_closing_iter_trace_runs_the_scope(scope):
+    chunks = scope.iter_trace(1, chunk_points=1000)
+    next(chunks)
+    assert not scope.instr.instr.sim.running
+    chunks.close()
+    assert scope.instr.instr.sim.running
+
+
+def test_capture(scope, tmp_path):
+    from eedlab.ds1054 import load_capture
+    path = str(tmp_path / 'ch1.u8')
+    capture = scope.capture(path, 1, chunk_points=5000)
+    assert len(capture) == 12000
+    assert capture.raw.dtype == np.uint8
+    assert capture.t[1] - capture.t[0] == pytest.approx(capture.x_increment)
+    loaded = load_capture(path)
+    np.testing.assert_array_equal(loaded[:], capture[:])
+    assert loaded[:].max() > 1.4 and loaded[:].min() < -1.4
+    assert scope.instr.instr.sim.running
+
+
+def test_capture_as_array(scope, tmp_path):
+    capture = scope.capture(str(tmp_path / 'ch2.u16'), 2, fmt='WORD')
+    assert capture.raw.dtype == np.dtype('<u2')
+    volts = np.array(capture, dtype=np.float32, copy=True)
+    assert volts.dtype == np.float32 and volts.shape == (12000,)
+    np.testing.assert_allclose(volts, capture[:], rtol=1e-6)
+
+
+def test_preamble_cached_per_source(scope):
+    scope.wav_source = 'CHAN1'
+    pre = scope.preamble()
+    scope.instr.instr.sim.set_value('CHANNEL1:SCALE', 2.0)
+    assert scope.preamble() is pre  # changed behind the driver's back
+    scope.channels[0].scale = 0.5
+    assert scope.preamble().y_increment == 0.5 / 25
+    scope.wav_source = 'CHAN2'
+    assert scope.preamble().y_increment == 1.0 / 25
+
+
+def test_preamble_not_reused_across_run_and_stop(scope):
+    scope.mem_depth = 120000
+    scope._set_wav('MODE', 'MAX')
+    scope.run()
+    assert scope.preamble().points == 1200  # the screen while running
+    scope.stop()
+    assert scope.preamble().points == 120000  # the whole memory once stopped
+    scope.run()
+    assert scope.preamble().points == 1200
+    assert len(scope.get_trace(1, batch=True)[0]) == 120000
+
+
+def test_get_traces_share_a_time_axis(scope):
+    traces, t = scope.get_traces((1, 2))
+    assert traces.shape == (2, len(t)) == (2, 12000)
+    # CH1 is 1.5 V and CH2 1 V lagging it by 90 degrees, both at 1 kHz
+    assert traces[0].max() > 1.4 and 0.9 < traces[1].max() < 1.1
+    zero = np.argmin(np.abs(t))
+    assert traces[0][zero] == pytest.approx(0, abs=0.1)
+    assert traces[1][zero] == pytest.approx(-1, abs=0.1)
+    assert scope.instr.instr.sim.running
+
+
+def test_acquire_loop(scope):
+    captures = list(scope.acquire_loop(3, chans=(1, 2), points=1000))
+    assert len(captures) == 3
+    traces, t = captures[0]
+    assert traces.shape == (2, 1000) and t.shape == (1000,)
+    assert scope.acquire_stats['captures'] == 3
+    assert scope.instr.instr.sim.running
+
+
+def test_acquire_loop_close_interrupts_trigger_wait(scope):
+    loop = scope.acquire_loop(100, queue_size=1)
+    next(loop)
+    # the next single shot now takes 6 s to trigger
+    scope.instr.instr.sim.set_value('TIMEBASE:MAIN:SCALE', 0.5)
+    t0 = time()
+    loop.close()
+    assert time() - t0 < 2
+    assert scope.trigger_status != 'WAIT'
+
+
+def test_measure_many(scope, bus):
+    log = bus(scope)
+    table = scope.measure_many(['FREQuency', 'VPP', 'RPHase'], ['CHAN1', ('CHAN1', 'CHAN2')])
+    assert len(log.queries) == 1
+    assert table['CHAN1']['FREQuency'] == 1e3
+    assert table['CHAN1']['VPP'] == pytest.approx(3.0, abs=0.1)
+    assert table[('CHAN1', 'CHAN2')]['RPHase'] == 90
+
+
+def test_measure_many_splits_long_messages(scope, bus):
+    log = bus(scope)
+    items = ['VMAX', 'VMIN', 'VPP', 'VAVG', 'VRMS', 'FREQuency', 'PERiod']
+    table = scope.measure_many(items, ['CHAN1', 'CHAN2', 'CHAN3', 'CHAN4'])
+    assert 1 < len(log.queries) < 28
+    assert all(len(q) <= scope.INPUT_BUFFER for q in log.queries)
+    assert table['CHAN4']['FREQuency'] == 1e5
+    assert scope.channels[2].measure_many(['PERiod']) == {'PERiod': 1e-4}
+
+
+def test_settings_cache(bus):
+    from eedlab.ds1054 import DS1054
+    scope = DS1054('SIM::DS1054', backends=['sim'], cache=True)
+    log = bus(scope)
+    assert scope.timebase == 1e-3
+    assert scope.timebase == 1e-3
+    assert scope.channels[1].scale == 1.0
+    assert len(log.queries) == 2
+    scope.timebase = 2e-3
+    scope.trigger_level = 0.5
+    assert scope.timebase == 2e-3 and scope.trigger_level == 0.5
+    assert len(log.queries) == 3  # trigger_type, read once for the level
+    scope.single()  # changes the sweep, so it is read again
+    scope.trigger_mode
+    assert len(log.queries) == 4
+    scope.invalidate()
+    assert scope.timebase == 2e-3
+    assert len(log.queries) == 5
+
+
+def test_settings_uncached_by_default(scope, bus):
+    log = bus(scope)
+    scope.timebase = 2e-3
+    assert scope.timebase == 2e-3
+    assert scope.timebase == 2e-3
+    assert len(log.queries) == 2
@@ -0,0 +1,30 @@
+import subprocess
+import sys
+
+
+def run(code):
+    """ run code in a fresh interpreter, returns what it prints """
+    return subprocess.check_output([sys.executable, '-c', code]).decode().split()
+
+
+def test_drivers_imported_on_first_use():
+    modules = run('import sys, eedlab; eedlab.DP832; print(" ".join(sys.modules))')
+    assert 'eedlab.dp832' in modules
+    assert 'eedlab.ds1054' not in modules and 'eedlab.dg1022' not in modules
+
+
+def test_numpy_not_imported_with_the_drivers():
+    modules = run('import sys, eedlab.dp832, eedlab.dm3058e, eedlab.dg1022; print(" ".join(sys.modules))')
+    assert 'numpy' not in modules
+    assert 'eedlab.ringbuffer' not in modules and 'eedlab.raw_socket' not in modules
+
+
+def test_numpy_imported_when_used(psu):
+    from eedlab import dp832
+    assert psu.snapshot().shape == (3,)
+    assert dp832.np.recarray is sys.modules['numpy'].recarray
+
+
+def test_dir():
+    import eedlab
+    assert {'DG1022', 'DM3058E', 'DP832', 'DS1054'} <= set(dir(eedlab))
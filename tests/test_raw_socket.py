@@ -0,0 +1,84 @@
+import socket
+import threading
+from time import sleep
+
+import pytest
+
+from eedlab.raw_socket import Instrument, parse_dev
+
+
+@pytest.fixture
+def replies():
+    """ replies(*pieces) serves one connection, sending pieces apart once a message arrives, returns its dev """
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+
+    def serve(pieces):
+        conn, _ = listener.accept()
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn.recv(65536)
+        for piece in pieces:
+            conn.sendall(piece)
+            sleep(0.02)  # so each piece arrives in its own recv
+        conn.close()
+
+    def start(*pieces):
+        thread = threading.Thread(target=serve, args=(pieces,))
+        thread.daemon = True
+        thread.start()
+        return '127.0.0.1:{}'.format(listener.getsockname()[1])
+
+    yield start
+    listener.close()
+
+
+def test_parse_dev():
+    assert parse_dev('TCPIP::10.0.0.2::5025::SOCKET') == ('10.0.0.2', 5025)
+    assert parse_dev('TCPIP0::10.0.0.2::SOCKET') == ('10.0.0.2', 5555)
+    assert parse_dev('10.0.0.2:5025') == ('10.0.0.2', 5025)
+    assert parse_dev('10.0.0.2') == ('10.0.0.2', 5555)
+
+
+def test_block_split_across_recvs(replies):
+    instr = Instrument(replies(b'#', b'9000', b'000014abc', b'def\nghi\n', b'jkl', b'\n', b'1\n'))
+    assert instr.query_raw('WAV:DATA?') == b'#9000000014abcdef\nghi\njkl'
+    assert instr.read() == '1'
+    instr.close()
+
+
+def test_block_and_next_reply_in_one_recv(replies):
+    instr = Instrument(replies(b'#13abc\n1\n'))
+    assert instr.query_raw('WAV:DATA?') == b'#13abc'
+    assert instr.read() == '1'
+    instr.close()
+
+
+def test_closed_connection(replies):
+    instr = Instrument(replies(b'#9000000010abc'))
+    with pytest.raises(IOError):
+        instr.query_raw('WAV:DATA?')
+    instr.close()
+
+
+def test_scope_over_a_socket():
+    from eedlab.ds1054 import DS1054
+    from eedlab.sim import serve
+    server = serve('DS1054', port=0)
+    try:
+        scope = DS1054(server.dev, backends=['raw_socket'])
+        assert scope.backend_name == 'raw_socket'
+        scope.mem_depth = 600000
+        trace, _ = scope.get_trace(1, batch=True)
+        assert len(trace) == 600000
+        assert trace.max() > 1.4 and trace.min() < -1.4
+        assert scope.measure('FREQuency', 'CHAN1') == 1e3
+        scope.instr.close()
+    finally:
+        server.close()
+
+
+def test_benchmark():
+    from eedlab.raw_socket import benchmark
+    latency, rate = benchmark(n=10, blocks=2, block_size=10000)
+    assert 0 < latency < 0.1 and rate > 0
@@ -0,0 +1,41 @@
+import numpy as np
+
+from eedlab.ringbuffer import RingBuffer, RunningStats
+
+
+def test_latest_wraps_around():
+    ring = RingBuffer(5, 2)
+    rows = np.arange(26, dtype=np.float64).reshape(13, 2)
+    for row in rows[:7]:
+        ring.append(row)
+    ring.extend(rows[7:])
+    assert len(ring) == 5
+    assert ring.count == 13
+    np.testing.assert_array_equal(ring.latest(), rows[-5:])
+    np.testing.assert_array_equal(ring.latest(2), rows[-2:])
+
+
+def test_extend_longer_than_ring():
+    ring = RingBuffer(4)
+    ring.extend(np.arange(3))
+    ring.extend(np.arange(10, 20))
+    assert ring.count == 13
+    np.testing.assert_array_equal(ring.latest()[:, 0], [16, 17, 18, 19])
+
+
+def test_latest_is_a_view():
+    ring = RingBuffer(3)
+    ring.extend([1, 2, 3, 4])
+    assert np.shares_memory(ring.latest(), ring.data)
+
+
+def test_running_stats_match_numpy():
+    values = np.random.RandomState(0).normal(size=(1000, 3))
+    stats = RunningStats(3)
+    for block in np.array_split(values, 7):
+        stats.update(block)
+    assert stats.n == 1000
+    np.testing.assert_allclose(stats.mean, values.mean(axis=0))
+    np.testing.assert_allclose(stats.variance, values.var(axis=0, ddof=1))
+    np.testing.assert_array_equal(stats.min, values.min(axis=0))
+    np.testing.assert_array_equal(stats.max, values.max(axis=0))
@@ -0,0 +1,56 @@
+import pytest
+
+from eedlab import scpi
+
+
+def test_join_messages():
+    cmds = ['a' * 10, 'b' * 10, 'c' * 10]
+    assert list(scpi.join_messages(cmds, 21)) == ['a' * 10 + ';' + 'b' * 10, 'c' * 10]
+    assert list(scpi.join_messages(['a' * 30], 21)) == ['a' * 30]
+
+
+def test_wait_opc_polls_esr(bus):
+    from eedlab.dm3058e import DM3058E
+    dmm = DM3058E('SIM::DM3058E', backends=['sim'])
+    dmm.write(':sample:count 20')
+    dmm.write(':rate:voltage:DC fast')
+    dmm.write(':initiate')
+    log = bus(dmm)
+    assert scpi.wait_opc(dmm) & 1
+    assert log.writes == ['*OPC']
+    assert 1 < log.queries.count('*ESR?')
+
+
+def test_wait_opc_block(bus):
+    from eedlab.dm3058e import DM3058E
+    dmm = DM3058E('SIM::DM3058E', backends=['sim'])
+    log = bus(dmm)
+    assert dmm.wait(timeout=30.0, block=True) == 1
+    assert log.queries == ['*OPC?']
+    assert dmm.instr.timeout == 5.0  # the I/O timeout is restored
+
+
+def test_wait_opc_timeout():
+    class Busy(object):
+        def write(self, message):
+            pass
+
+        def ask(self, message):
+            return '0'
+
+    with pytest.raises(scpi.ScpiTimeout):
+        scpi.wait_opc(Busy(), timeout=0.02)
+
+
+def test_ask_many():
+    class Echo(object):
+        asked = []
+
+        def ask(self, message):
+            self.asked.append(message)
+            return ';'.join(' {} '.format(q) for q in message.split(';'))
+
+    instr = Echo()
+    queries = ['Q{}?'.format(i) for i in range(10)]
+    assert scpi.ask_many(instr, queries, 12) == queries
+    assert instr.asked == ['Q0?;Q1?;Q2?', 'Q3?;Q4?;Q5?', 'Q6?;Q7?;Q8?', 'Q9?']
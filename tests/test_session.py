@@ -0,0 +1,129 @@
+import threading
+
+import pytest
+
+from eedlab import scpi
+from eedlab.sim import Instrument
+
+
+def test_concurrent_queries_coalesce():
+    on_bus = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    class Slow(object):
+        def query(self, message):
+            calls.append(message)
+            on_bus.set()
+            release.wait(5)
+            return 'reply'
+
+    session = scpi.Session(Slow())
+    replies = []
+    threads = [threading.Thread(target=lambda: replies.append(session.query('MEAS?'))) for _ in range(5)]
+    threads[0].start()
+    on_bus.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert replies == ['reply'] * 5
+    assert len(calls) < 5
+    assert not session._pending
+
+
+def test_lock_holder_does_not_wait_on_queued_query():
+    session = scpi.Session(Instrument('SIM::DP832'))
+    replies = []
+    query = ':measure:all:DC? CH1'
+    other = threading.Thread(target=lambda: replies.append(session.query(query)))
+    other.daemon = True
+
+    def hold():
+        with session.lock:
+            other.start()
+            other.join(0.1)  # queued behind us for the lock
+            replies.append(session.query(query))
+
+    holder = threading.Thread(target=hold)
+    holder.daemon = True
+    holder.start()
+    holder.join(5)
+    other.join(5)
+    assert not holder.is_alive() and not other.is_alive()
+    assert len(replies) == 2
+
+
+def test_lock_keeps_a_sequence_together(psu):
+    stop = threading.Event()
+
+    def meddle():
+        while not stop.is_set():
+            psu.write(':source1:volt 1')
+
+    thread = threading.Thread(target=meddle)
+    thread.start()
+    try:
+        for _ in range(20):
+            with psu.instr.lock:
+                psu.write(':source1:volt 3')
+                assert float(psu.ask(':source1:voltage?')) == 3
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_query_after_write_sees_it(psu):
+    psu.write(':source1:volt 3')
+    assert float(psu.ask(':source1:voltage?')) == 3
+
+
+def test_batch_sends_one_message(psu, bus):
+    log = bus(psu)
+    with psu.batch():
+        a = psu.ask(':source1:voltage?')
+        psu.write(':source1:volt 5')
+        b = psu.ask(':source1:voltage?')
+        assert not a.ready
+    assert len(log.queries) == 1 and not log.writes
+    assert float(a) == 0 and float(b) == 5
+
+
+def test_batch_ask_many_gets_every_reply(scope, bus):
+    log = bus(scope)
+    with scope.batch():
+        table = scope.measure_many(['VPP', 'FREQuency'], ['CHAN1', 'CHAN3'])
+    assert len(log.queries) == 1
+    assert table['CHAN1']['FREQuency'] == 1e3
+    assert table['CHAN3']['FREQuency'] == 1e4
+    assert table['CHAN3']['VPP'] == pytest.approx(1.0, abs=0.1)
+
+
+def test_limits_read_in_a_batch(psu):
+    with psu.batch():
+        psu.channels[0].vdc
+    assert psu.limits == [(0.0, 32.0, 0.0, 3.2), (0.0, 32.0, 0.0, 3.2), (0.0, 5.3, 0.0, 3.2)]
+    assert len(psu.snapshot()) == 3
+
+
+def test_write_raw_keeps_batch_order(gen, bus):
+    log = bus(gen)
+    with gen.batch():
+        gen.write('FREQUENCY 1234')
+        gen.write_raw(b'DATA:DAC VOLATILE,#14\x00\x00\xff\x3f\n')
+        gen.write('VOLTAGE 2')
+    assert log.writes[0] == ':FREQUENCY 1234'
+    assert log.writes[1].startswith(b'DATA:DAC')
+    assert log.writes[2] == ':VOLTAGE 2'
+    assert list(gen.instr.instr.sim.volatile) == [0, 16383]
+
+
+def test_abandoned_batch(psu):
+    with pytest.raises(KeyError):
+        with psu.batch():
+            reply = psu.ask(':source1:voltage?')
+            raise KeyError('oops')
+    with pytest.raises(IOError):
+        reply.value
+    assert float(psu.ask(':source1:voltage?')) == 0
@@ -0,0 +1,35 @@
+from eedlab.sim import DP832, DS1054, parse_dev
+from eedlab.sim.core import normalise
+
+
+def test_normalise():
+    assert normalise(':source2:voltage?') == ('SOUR#:VOLT?', [2])
+    assert normalise('WAV:PREamble?') == ('WAV:PRE?', [])
+
+
+def test_parse_dev():
+    assert parse_dev('SIM::DS1054::latency=0.001') == ('DS1054', {'latency': 0.001})
+
+
+def test_compound_message_replies_in_order():
+    sim = DP832()
+    assert sim.handle(b':source1:volt 3;:source1:volt?;*IDN?') == b'3.000;' + DP832.IDN.encode() + b'\n'
+
+
+def test_unknown_command_queues_an_error():
+    sim = DP832()
+    assert sim.handle(b':bogus 1') is None
+    assert sim.handle(b':source3:volt 30') is None  # beyond the 5.3 V of CH3
+    assert sim.handle(b':system:error?;:system:error?;:system:error?') == \
+        b'-113,"Undefined header";-222,"Data out of range";0,"No error"\n'
+
+
+def test_phase_positive_when_b_lags_a():
+    sim = DS1054()
+    # CH2 lags CH1 by 90 degrees
+    assert sim.handle(b':measure:item? RPHase,CHAN1,CHAN2') == b'9.000000e+01\n'
+    assert sim.handle(b':measure:item? RPHase,CHAN2,CHAN1') == b'-9.000000e+01\n'
+
+
+def test_scope_phase(scope):
+    assert scope.measure('RPHase', ['CHAN1', 'CHAN2']) == 90